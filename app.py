@@ -1,24 +1,304 @@
 # start flask web serve
+import os
+import time
+import uuid
+import atexit
+import argparse
+import threading
 import flask
+import engine
+import metrics
+import practice
+from assets import StaticAssets
+from decks import DeckManager, userIdPattern
+try:
+    import waitress
+except ImportError:
+    waitress = None
 
 app = flask.Flask(__name__)
+# read and compressed once, at startup
+assets = StaticAssets(os.path.join(app.root_path, 'static'))
+
+# Every user has their own deck under decks/<user>, loaded on first use and
+# locked per request. Only starting a round (/api/session) makes a new deck,
+# up to maxUserDecks of them; other requests for a user without one get 404. The default user, for requests that name none, has the
+# terminal app's deck (vocab.json and friends in the working folder), so both
+# front ends share its progress. Answers are saved through the store's journal, so
+# requests never rewrite the whole deck.
+decks = None
+sessionLock = threading.Lock()
+sessions = {}
+sessionTimeout = 60 * 60
+
+
+def getDecks():
+    global decks
+    with sessionLock:
+        if decks is None:
+            practice.loadSettings()
+            decks = DeckManager(practice.settings, maxDecks=practice.settings.get('maxOpenDecks', 64),
+                                folders={'default': '.'},
+                                maxCreated=practice.settings.get('maxUserDecks', 1000))
+            atexit.register(decks.closeAll)
+    return decks
+
+
+# Times every request by endpoint when metrics are on.
+@app.before_request
+def startTimer():
+    if metrics.enabled:
+        flask.g.started = time.perf_counter()
+
+
+@app.after_request
+def stopTimer(response):
+    if metrics.enabled and 'started' in flask.g:
+        metrics.observe(f'request {flask.request.endpoint}', time.perf_counter() - flask.g.started)
+    return response
+
+
+def apiError(message, status):
+    return flask.jsonify({'error': message}), status
+
+
+def expireSessions(now):
+    for sessionId in [s for s in sessions if now - sessions[s]['lastSeen'] > sessionTimeout]:
+        del sessions[sessionId]
+
+
+def getSession(data):
+    with sessionLock:
+        session = sessions.get(data.get('session'))
+    if session is not None:
+        session['lastSeen'] = time.time()
+    return session
+
+
+# The user a request is for, or None when the id is not a valid folder name.
+def getUser(data):
+    user = data.get('user', 'default')
+    if not isinstance(user, str) or not userIdPattern.match(user):
+        return None
+    return user
+
+
+# The question as the client sees it, without the right answer.
+def questionResponse(store, session):
+    question = session['question']
+    vWord = store.vocab[question['word']]
+    response = {
+        'index': session['index'] + 1,
+        'count': len(session['questions']),
+        'word': question['word'],
+        'game': question['game'],
+        'score': vWord['score'],
+    }
+    if question['game'] == "multiple choice":
+        response['answers'] = question['answers']
+    elif question['game'] == "true/false":
+        response['shown'] = question['shown']
+    return response
+
+
+# start a practice round
+@app.route('/api/session', methods=['POST'])
+def createSession():
+    data = flask.request.get_json(silent=True) or {}
+    user = getUser(data)
+    if user is None:
+        return apiError('Invalid user.', 400)
+    seed = data.get('seed')
+    if not isinstance(seed, int) or isinstance(seed, bool):
+        seed = None
+    try:
+        with getDecks().deck(user, create=True) as store:
+            questions = engine.planRound(store, bool(data.get('practiceAll')), seed=seed)
+    except ValueError as e:
+        return apiError(str(e), 403)
+    now = time.time()
+    sessionId = uuid.uuid4().hex
+    with sessionLock:
+        expireSessions(now)
+        sessions[sessionId] = {
+            'user': user,
+            'questions': questions,
+            'index': 0,
+            'question': None,
+            'correct': 0,
+            'wrong': 0,
+            'lastSeen': now,
+        }
+    return flask.jsonify({'session': sessionId, 'count': len(questions)})
+
+
+# the current question of a round, asking it if needed
+@app.route('/api/next')
+def nextQuestion():
+    session = getSession(flask.request.args)
+    if session is None:
+        return apiError('Unknown session.', 404)
+    with getDecks().deck(session['user']) as store:
+        while session['question'] is None:
+            if session['index'] >= len(session['questions']):
+                return flask.jsonify({'done': True, 'correct': session['correct'], 'wrong': session['wrong']})
+            question = session['questions'][session['index']]
+            if question['word'] not in store.vocab:
+                # deleted since the round was planned
+                session['questions'].pop(session['index'])
+                continue
+            engine.startQuestion(store, question['word'])
+            session['question'] = dict(question, askedAt=time.time())
+        return flask.jsonify(questionResponse(store, session))
+
+
+# grade the answer to the current question
+@app.route('/api/answer', methods=['POST'])
+def answerQuestion():
+    data = flask.request.get_json(silent=True) or {}
+    session = getSession(data)
+    if session is None:
+        return apiError('Unknown session.', 404)
+    with getDecks().deck(session['user']) as store:
+        question = session['question']
+        if question is None:
+            return apiError('No question has been asked.', 409)
+
+        answer = data.get('answer')
+        if isinstance(answer, bool):
+            answer = "1" if answer else "2"
+        isGoodAnswer = data.get('remembered', True) and \
+            engine.isCorrectAnswer(store, question, str(answer))
+        word = question['word']
+        vWord = store.vocab[word]
+        now = time.time()
+        engine.gradeAnswer(vWord, isGoodAnswer, store.policy, now)
+        with metrics.phase('save word'):
+            store.saveWord(word, vWord)
+        confusedWith = engine.confusedWith(question, str(answer)) if data.get('remembered', True) else None
+        store.logReview(word, question['game'], isGoodAnswer, now - question['askedAt'], now, confusedWith)
+
+        session['question'] = None
+        session['index'] += 1
+        if isGoodAnswer:
+            session['correct'] += 1
+        else:
+            session['wrong'] += 1
+        return flask.jsonify({
+            'correct': bool(isGoodAnswer),
+            'translation': vWord['word'],
+            'score': vWord['score'],
+            'streak': vWord['streak'],
+        })
+
+
+# the word list, in the same order as the terminal app shows it
+@app.route('/api/words')
+def listWords():
+    args = flask.request.args
+    try:
+        offset = max(int(args.get('offset', 0)), 0)
+        limit = min(max(int(args.get('limit', 100)), 0), 1000)
+    except ValueError:
+        return apiError('offset and limit must be numbers.', 400)
+    user = getUser(args)
+    if user is None:
+        return apiError('Invalid user.', 400)
+    if not getDecks().exists(user):
+        return apiError('Unknown user.', 404)
+    with getDecks().deck(user) as store:
+        now = time.time()
+        words = engine.getCategoryWords(store, args.get('category'), now)
+        adjusted = engine.getWordListLayout(store, now)['adjusted']
+        page = [{
+            'word': word,
+            'translation': store.vocab[word]['word'],
+            'category': store.vocab[word]['category'],
+            'isFavorite': store.vocab[word]['isFavorite'],
+            'score': adjusted.score(word),
+            'color': adjusted.color(word),
+        } for word in words[offset:offset + limit]]
+    return flask.jsonify({'total': len(words), 'offset': offset, 'words': page})
+
+
+# Words matching q by prefix or within a few typos, with the offset of each
+# in /api/words (without a category) so a client can page to it.
+@app.route('/api/search')
+def searchWords():
+    args = flask.request.args
+    try:
+        limit = min(max(int(args.get('limit', 10)), 0), 100)
+    except ValueError:
+        return apiError('limit must be a number.', 400)
+    user = getUser(args)
+    if user is None:
+        return apiError('Invalid user.', 400)
+    if not getDecks().exists(user):
+        return apiError('Unknown user.', 404)
+    with getDecks().deck(user) as store:
+        now = time.time()
+        matches = [{
+            'word': word,
+            'translation': store.vocab[word]['word'],
+            'category': store.vocab[word]['category'],
+            'offset': engine.getWordLine(store, word, now),
+        } for word in store.searchWords(args.get('q', ''), limit)]
+    return flask.jsonify({'words': matches})
+
+
+# per-category counts, scores and due words
+@app.route('/api/stats')
+def deckStatistics():
+    user = getUser(flask.request.args)
+    if user is None:
+        return apiError('Invalid user.', 400)
+    if not getDecks().exists(user):
+        return apiError('Unknown user.', 404)
+    with getDecks().deck(user) as store:
+        return flask.jsonify(engine.getDeckStats(store))
+
 
 # serve files from folder static
 
 
 @app.route('/<path:path>')
 def send_js(path):
-    return flask.send_from_directory('static', path)
+    response = assets.response(path)
+    if response is None:
+        flask.abort(404)
+    return response
 
 # serve index.html
 
 
 @app.route('/')
 def send_index():
-    return flask.send_from_directory('static', 'index.html')
+    return assets.response('index.html')
 
 
-if __name__ == '__main__':
-    # run on port 8080
-    app.run(host='0.0.0.0', port=8080)
+# Production mode serves requests from a pool of threads, through waitress when
+# it is installed and the threaded werkzeug server otherwise.
+def serve(host, port, threads):
+    if waitress is not None:
+        waitress.serve(app, host=host, port=port, threads=threads)
+    else:
+        from werkzeug.serving import make_server
+        make_server(host, port, app, threaded=True).serve_forever()
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='BrainBurner web server.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--production', action='store_true',
+                        help='serve with a thread pool instead of the development server')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--profile', action='store_true',
+                        help='print request timings, and per-function timings of the main thread, on exit')
+    args = parser.parse_args()
+    if args.profile:
+        metrics.enable()
+    if args.production:
+        serve(args.host, args.port, args.threads)
+    else:
+        app.run(host=args.host, port=args.port)
@@ -0,0 +1,105 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import flask
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+assetMaxAge = 60 * 60 * 24 * 7
+minCompressSize = 512
+
+
+# One file from the static folder, read and compressed once. bodies maps a
+# content encoding ('identity', 'gzip', 'br') to the bytes to send for it,
+# and etags to its strong validator: each encoding is its own
+# representation, so the compressed ones get the hash with the encoding
+# appended.
+class Asset:
+    def __init__(self, file, maxAge):
+        with open(file, 'rb') as f:
+            data = f.read()
+        self.mimetype = mimetypes.guess_type(file)[0] or 'application/octet-stream'
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.maxAge = maxAge
+        self.bodies = {'identity': data}
+        self.etags = {'identity': self.etag}
+        if len(data) >= minCompressSize and isCompressible(self.mimetype):
+            self._addEncoding('gzip', gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                self._addEncoding('br', brotli.compress(data, quality=11))
+
+    def _addEncoding(self, encoding, body):
+        if len(body) < len(self.bodies['identity']):
+            self.bodies[encoding] = body
+            self.etags[encoding] = f"{self.etag}-{encoding}"
+
+    # The smallest body the client accepts; an encoding given with q=0 is
+    # refused.
+    def pickEncoding(self, acceptEncoding):
+        accepted = set()
+        for part in acceptEncoding.lower().split(','):
+            encoding, *params = part.split(';')
+            if qValue(params) > 0:
+                accepted.add(encoding.strip())
+        best = 'identity'
+        for encoding in self.bodies:
+            if encoding in accepted and len(self.bodies[encoding]) < len(self.bodies[best]):
+                best = encoding
+        return best
+
+
+# The weight given by the q= parameter of an Accept-Encoding entry, 1 if there
+# is none and 0 if it is not a number.
+def qValue(params):
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0
+    return 1
+
+
+def isCompressible(mimetype):
+    return mimetype.startswith('text/') or mimetype in (
+        'application/javascript', 'application/json', 'image/svg+xml')
+
+
+# Every file under folder kept in memory for the life of the server and served
+# with an ETag, conditional GET (304) and Cache-Control. index.html is always
+# revalidated so new builds show up; everything else may be cached for
+# assetMaxAge seconds.
+class StaticAssets:
+    def __init__(self, folder, maxAge=assetMaxAge):
+        self.assets = {}
+        for directory, _, files in os.walk(folder):
+            for name in files:
+                file = os.path.join(directory, name)
+                path = os.path.relpath(file, folder).replace(os.sep, '/')
+                self.assets[path] = Asset(file, 0 if name == 'index.html' else maxAge)
+
+    def size(self):
+        return sum(len(asset.bodies['identity']) for asset in self.assets.values())
+
+    # A flask response for path, or None when there is no such file.
+    def response(self, path):
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        request = flask.request
+        encoding = asset.pickEncoding(request.headers.get('Accept-Encoding', ''))
+        headers = {
+            'ETag': f'"{asset.etags[encoding]}"',
+            'Cache-Control': f'public, max-age={asset.maxAge}' if asset.maxAge else 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        # weak comparison, so W/"..." from a client or proxy still matches
+        if request.if_none_match.contains_weak(asset.etags[encoding]):
+            return flask.Response(status=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return flask.Response(asset.bodies[encoding], mimetype=asset.mimetype, headers=headers)
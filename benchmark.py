@@ -0,0 +1,891 @@
+# Performance benchmarks for BrainBurner, and checks of the fast paths
+# against from-scratch references.
+# Usage: python benchmark.py [name ...]
+#        python benchmark.py check [name ...]  (exits with 1 if any check fails)
+import io
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+import threading
+import http.client
+import subprocess
+import engine
+import practice
+from decks import DeckManager
+from pipeline import RoundPipeline
+from scheduler import Scheduler
+from categoryindex import CategoryIndex
+from scoring import ScoreColumns, scoreColors
+from storage import Store, JsonStore, BinaryStore, saveJson, loadJson
+from policies import DecayPolicy
+from records import compactVocab
+from reviewlog import ReviewLog, readReviews
+from confusions import ConfusionMatrix
+import simulator
+import grading
+import searchindex
+import metrics
+import json
+from screen import Screen
+
+benchSettings = {
+    "maxScore": 10,
+    "maxStreak": 35,
+    "numPracticeWords": 8,
+    "categories": ["nouns", "verbs", "adjectives", "adverbs", "phrases", "days"],
+    "screenWidth": 93,
+    "pageSize": 20,
+    "bgColor": "black",
+    "fgColor": "white",
+    "highlightColorFG": "blue",
+    "highlightColorBG": "lightGray",
+    "borderColor": "blue",
+    "seperatorColor": "darkBlue",
+    "showScore": True,
+    "showTranslations": True,
+}
+
+
+def makeVocab(size, seed=0):
+    rng = random.Random(seed)
+    now = time.time()
+    vocab = {}
+    for i in range(size):
+        vocab[f"word{i}"] = {
+            'word': f"translation{i}",
+            'category': rng.choice(benchSettings['categories']),
+            'isFavorite': rng.random() < 0.01,
+            'lastPracticed': now - rng.uniform(0, 3600 * 24 * 30),
+            'score': rng.randint(0, 16),
+            'streak': rng.randint(0, 40),
+        }
+    return vocab
+
+
+# Points practice.py at an in-memory deck, with no files involved.
+def useDeck(vocab, settings=benchSettings):
+    practice.settings = dict(settings)
+    practice.vocab = vocab
+    practice.store = Store(practice.settings)
+    practice.store.vocab = vocab
+    practice.store._rebuildIndexes()
+    practice.screen = Screen(io.StringIO())
+    practice.applyTheme()
+
+
+def timeIt(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def printResult(name, size, seconds):
+    print(f"{name:<40} {size:>9} words {seconds * 1000:>12.3f} ms")
+
+
+# sortVocab as it was before scores were computed in batches.
+def legacySortVocab(reverse=False):
+    vocab = practice.vocab
+    sortedV = sorted(vocab, key=lambda k: practice.adjustScoreBasedOnTime(
+        vocab[k]), reverse=reverse)
+    removedFavorites = []
+    for i in range(len(sortedV)):
+        if vocab[sortedV[i]]['isFavorite']:
+            removedFavorites.append(sortedV[i])
+    for i in range(len(removedFavorites)):
+        sortedV.remove(removedFavorites[i])
+
+    if reverse:
+        sortedV.reverse()
+        sortedV.extend(removedFavorites)
+        sortedV.reverse()
+    else:
+        sortedV.extend(removedFavorites)
+
+    return sortedV
+
+
+# The selection path getPracticeWords used before the scheduler existed.
+def legacyPracticeWords(num):
+    vocab = practice.vocab
+    sortedVocab = legacySortVocab(reverse=True)
+    wordsToPractice = []
+    i = 0
+    while len(wordsToPractice) < num and i < len(sortedVocab):
+        word = sortedVocab[i]
+        adjustedScore = practice.adjustScoreBasedOnTime(vocab[word])
+        if adjustedScore < practice.settings["maxScore"] and time.time() - vocab[word]['lastPracticed'] > 60 * 5:
+            wordsToPractice.append(word)
+        i += 1
+    ammountLeft = num - len(wordsToPractice)
+    if ammountLeft:
+        wordsToPractice.extend(sortedVocab[-ammountLeft:])
+    return wordsToPractice
+
+
+def benchScheduler(sizes=(1000, 100000, 1000000)):
+    for size in sizes:
+        vocab = makeVocab(size)
+        useDeck(vocab)
+        num = benchSettings['numPracticeWords']
+        printResult("legacy sort + scan", size,
+                    timeIt(lambda: legacyPracticeWords(num)))
+
+        scheduler = Scheduler(DecayPolicy(practice.settings))
+        printResult("scheduler build", size,
+                    timeIt(lambda: scheduler.rebuild(vocab)))
+        printResult("scheduler next words", size,
+                    timeIt(lambda: scheduler.nextWords(num, time.time()), 100))
+
+        words = scheduler.nextWords(num, time.time())
+
+        def answerRound():
+            for word in words:
+                vocab[word]['score'] += 1
+                vocab[word]['streak'] += 1
+                vocab[word]['lastPracticed'] = time.time()
+                scheduler.update(word, vocab[word])
+        printResult("scheduler update per round", size, timeIt(answerRound, 100))
+
+
+# Wrong-answer lookup the way practice() built it before the category index.
+def legacyDistractors(vocab, word, count):
+    vWord = vocab[word]
+    categoryWords = [vocab[w]['word'] for w in vocab if vocab[w]['category'] == vWord['category']]
+    categoryWords.remove(vWord['word'])
+    nonCategoryWords = [vocab[w]['word'] for w in vocab if vocab[w]['category'] != vWord['category']]
+    answers = set(random.sample(categoryWords, min(count, len(categoryWords))))
+    if len(answers) < count:
+        answers.update(random.sample(nonCategoryWords, count - len(answers)))
+    return answers
+
+
+def benchDistractors(sizes=(1000, 10000, 100000, 1000000)):
+    for size in sizes:
+        vocab = makeVocab(size)
+        words = random.Random(1).sample(list(vocab), 100)
+        repeat = 20 if size <= 10000 else 2
+        printResult("legacy per-question distractors", size,
+                    timeIt(lambda: [legacyDistractors(vocab, w, 3) for w in words[:repeat]]) / repeat)
+
+        index = CategoryIndex()
+        printResult("category index build", size,
+                    timeIt(lambda: index.rebuild(vocab)))
+        printResult("index per-question distractors", size,
+                    timeIt(lambda: [index.sample(w, vocab[w]['category'], 3) for w in words]) / len(words))
+
+
+def benchScores(sizes=(1000, 100000, 1000000)):
+    for size in sizes:
+        vocab = makeVocab(size)
+        useDeck(vocab)
+        now = time.time()
+
+        def perWord():
+            return [(practice.adjustScoreBasedOnTime(vocab[w], now), practice.getScoredColor(vocab[w], now)) for w in vocab]
+        printResult("per-word score + color", size, timeIt(perWord))
+
+        columns = ScoreColumns()
+        printResult("score columns build", size, timeIt(lambda: columns.rebuild(vocab)))
+        printResult("batch adjustScores", size,
+                    timeIt(lambda: columns.adjustScores(now, practice.settings)))
+
+
+# Words whose batch score or color differs from the per-word
+# adjustScoreBasedOnTime and getScoredColor.
+def checkScores(size=100000):
+    vocab = makeVocab(size)
+    useDeck(vocab)
+    now = time.time()
+    columns = ScoreColumns()
+    columns.rebuild(vocab)
+    adjusted = columns.adjustScores(now, practice.settings)
+    colors = {practice.formatting['fg'][c]: c for c in scoreColors}
+    return sum(1 for w in vocab if adjusted.score(w) != practice.adjustScoreBasedOnTime(vocab[w], now)
+               or adjusted.color(w) != colors[practice.getScoredColor(vocab[w], now)])
+
+
+def benchWordList(sizes=(1000, 10000, 100000)):
+    for size in sizes:
+        useDeck(makeVocab(size))
+
+        def render(selectLine):
+            practice.clearScreen()
+            practice.printWordList(selectLine=selectLine, paged=True)
+            practice.screen.out = io.StringIO()
+            practice.screen.flush()
+        printResult("word list first render", size, timeIt(lambda: render(0)))
+        printResult("word list page render", size,
+                    timeIt(lambda: render(random.randrange(size)), 100))
+
+
+# Cost of a list or stats view built from scratch, served from the view cache,
+# and rebuilt after one answer was saved.
+def benchViews(sizes=(1000, 100000)):
+    for size in sizes:
+        vocab = makeVocab(size)
+        useDeck(vocab)
+        store = practice.store
+        now = time.time()
+        printResult("word list layout uncached", size, timeIt(lambda: engine.buildWordListLayout(store, now)))
+        engine.getWordListLayout(store, now)
+        printResult("word list layout cached", size, timeIt(lambda: engine.getWordListLayout(store, now), 1000))
+        printResult("category words cached", size,
+                    timeIt(lambda: engine.getCategoryWords(store, 'verbs', now), 1000))
+        printResult("deck stats uncached", size, timeIt(lambda: engine.deckStats(store, now)))
+        engine.getDeckStats(store, now)
+        printResult("deck stats cached", size, timeIt(lambda: engine.getDeckStats(store, now), 1000))
+        word = next(iter(vocab))
+
+        def answerAndList():
+            vocab[word]['score'] += 1
+            store._indexWord(word, vocab[word])
+            engine.getWordListLayout(store, now)
+        printResult("word list after an answer", size, timeIt(answerAndList, 3))
+
+
+# Random answers, edits, favorites, moves, deletes and adds applied through
+# the store, each followed by a comparison of the incremental DeckOrder layout
+# against a from-scratch buildWordListLayout, which sorts with sortVocab.
+# Time is frozen so both score the deck at the same moment. Returns the
+# number of layouts that differ.
+def checkOrdering(size=2000, steps=2000, seed=0):
+    rng = random.Random(seed)
+    vocab = makeVocab(size, seed)
+    useDeck(vocab)
+    store = practice.store
+    now = time.time()
+    mismatches = 0
+    for step in range(steps):
+        word = rng.choice(list(vocab))
+        action = rng.random()
+        if action < 0.05:
+            del vocab[word]
+            store._unindexWord(word)
+        else:
+            if action < 0.1:
+                word = f"new{step}"
+                vocab[word] = {'word': word, 'category': rng.choice(benchSettings['categories']),
+                               'isFavorite': False, 'lastPracticed': now, 'score': 0, 'streak': 0}
+            elif action < 0.2:
+                vocab[word]['isFavorite'] = not vocab[word]['isFavorite']
+            elif action < 0.25:
+                vocab[word]['category'] = rng.choice(benchSettings['categories'] + ['other'])
+            else:
+                engine.startQuestion(store, word, now)
+                engine.gradeAnswer(vocab[word], rng.random() < 0.7)
+            store._indexWord(word, vocab[word])
+        for reverse in (False, True):
+            layout = engine.getWordListLayout(store, now, reverse)
+            expected = engine.buildWordListLayout(store, now, reverse)
+            same = layout['words'] == expected['words'] and layout['groupStarts'] == expected['groupStarts'] \
+                and layout['categories'] == expected['categories'] and all(
+                    layout['adjusted'].score(w) == expected['adjusted'].score(w) and
+                    layout['adjusted'].color(w) == expected['adjusted'].color(w) for w in vocab)
+            mismatches += not same
+    return mismatches
+
+
+def benchOrdering(sizes=(1000, 100000, 1000000)):
+    for size in sizes:
+        vocab = makeVocab(size)
+        useDeck(vocab)
+        store = practice.store
+        now = time.time()
+        if size <= 100000:
+            printResult("full layout (buildWordListLayout)", size,
+                        timeIt(lambda: engine.buildWordListLayout(store, now)))
+        store.orders.clear()
+        printResult("deck order build", size, timeIt(lambda: engine.getWordListLayout(store, now)))
+        words = random.Random(2).sample(list(vocab), 100)
+
+        def answerWord():
+            word = words.pop()
+            engine.startQuestion(store, word, now)
+            engine.gradeAnswer(vocab[word], True)
+            store._indexWord(word, vocab[word])
+        printResult("reposition one answered word", size, timeIt(answerWord, 50))
+        printResult("layout after an answer", size,
+                    timeIt(lambda: (answerWord(), engine.getWordListLayout(store, now)), 50))
+
+
+# Memory held by a deck as json.load gives it (a dict per word, a category
+# string per word) against WordRecords, and the cost of reading a field.
+def benchRecords(sizes=(100000, 1000000)):
+    for size in sizes:
+        text = json.dumps(makeVocab(size))
+        tracemalloc.start()
+        vocab = json.loads(text)
+        dictBytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        words = list(vocab)[:100000]
+        dictRead = min(timeIt(lambda vocab=vocab: [vocab[w]['score'] for w in words]) for _ in range(5))
+
+        tracemalloc.start()
+        vocab = compactVocab(json.loads(text))
+        recordBytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        recordRead = min(timeIt(lambda vocab=vocab: [vocab[w]['score'] for w in words]) for _ in range(5))
+        del vocab
+        print(f"{size:>9} words   dicts {dictBytes / size:>6.0f} B/word   records {recordBytes / size:>6.0f} B/word   "
+              f"read {dictRead / len(words) * 1e9:.0f} ns -> {recordRead / len(words) * 1e9:.0f} ns")
+
+
+# Time to open a deck and pick the first round from vocab.json and from a
+# vocab.bin snapshot, and how many records each had to decode. The due times
+# of the picked words must match, whichever of several equally due words got
+# picked.
+def benchSnapshot(sizes=(10000, 100000, 1000000)):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            saveJson(makeVocab(size), os.path.join(root, 'vocab.json'))
+            settings = dict(benchSettings)
+            picks = {}
+            for name, makeStore in (
+                    ("json", lambda: JsonStore(settings, os.path.join(root, 'vocab.json'), os.path.join(root, 'j'))),
+                    ("binary", lambda: BinaryStore(settings, os.path.join(root, 'vocab.bin'), os.path.join(root, 'bj'),
+                                                   os.path.join(root, 'vocab.json')))):
+                if name == "binary":
+                    converter = makeStore()  # converts vocab.json once
+                    converter.load()
+                    converter.close()
+                    print(f"{'binary snapshot size':<40} {size:>9} words "
+                          f"{os.path.getsize(os.path.join(root, 'vocab.bin')) / 1024 / 1024:>9.1f} MiB "
+                          f"(json {os.path.getsize(os.path.join(root, 'vocab.json')) / 1024 / 1024:.1f} MiB)")
+                store = makeStore()
+                now = time.time()
+
+                def openAndPick():
+                    store.load()
+                    words = store.practiceWords(settings['numPracticeWords'], now)
+                    for word in words:
+                        store.distractors(word, 3)
+                    return words
+                started = time.perf_counter()
+                words = openAndPick()
+                printResult(f"{name} open + first round", size, time.perf_counter() - started)
+                picks[name] = sorted(store.policy.dueTime(store.vocab[w]) for w in words)
+                if name == "binary":
+                    print(f"{'binary records decoded':<40} {size:>9} words {len(store.vocab.loaded):>12}")
+                store.close()
+            print(f"{'due times differing from json store':<40} {size:>9} words "
+                  f"{sum(a != b for a, b in zip(picks['json'], picks['binary'])):>12}")
+
+
+# Runs in a fresh interpreter inside the deck folder: imports practice, loads
+# the deck and draws the main menu, then prints the milliseconds taken. legacy
+# also rewrites the deck the way loadVocab used to.
+startupScript = """
+import io, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import practice
+from screen import Screen
+practice.screen = Screen(io.StringIO())
+practice.load()
+if sys.argv[2] == 'legacy':
+    practice.store.saveAll(practice.vocab)
+practice.clearScreen()
+practice.printMainMenu(not practice.settings.get('fastStart', False))
+practice.screen.flush()
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+# Time from process start to the first main menu frame, across deck sizes:
+# the old path (rewrite the deck, draw the word list) against fastStart on
+# the json and binary stores.
+def benchStartup(sizes=(1000, 10000, 100000)):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            saveJson(makeVocab(size), os.path.join(root, 'vocab.json'))
+            for name, storage, fastStart, mode in (
+                    ("legacy json + list", 'json', False, 'legacy'),
+                    ("json + list", 'json', False, 'fast'),
+                    ("json fastStart", 'json', True, 'fast'),
+                    ("binary fastStart", 'binary', True, 'fast')):
+                settings = dict(practice.defaultSettings, storage=storage, fastStart=fastStart,
+                                categories=benchSettings['categories'])
+                saveJson(settings, os.path.join(root, 'settings.json'))
+                if storage == 'binary' and not os.path.exists(os.path.join(root, 'vocab.bin')):
+                    subprocess.run([sys.executable, '-c', startupScript, here, 'fast'], cwd=root,
+                                   capture_output=True, check=True)
+                result = subprocess.run([sys.executable, '-c', startupScript, here, mode], cwd=root,
+                                        capture_output=True, text=True, check=True)
+                printResult(f"startup {name}", size, float(result.stdout.split()[-1]) / 1000)
+
+
+# Load test: many users answering at the same time, each through their own
+# deck. Runs once with a slot for every deck and once with a quarter of that,
+# so decks keep getting evicted and reloaded. Every answer is correct, so
+# afterwards the streaks on disk must add up to the number of answers or an
+# update was lost.
+def benchDecks(userCounts=(50, 300), answersPerUser=20, wordsPerUser=200):
+    for users, slots in [(users, slots) for users in userCounts for slots in (users, max(users // 4, 1))]:
+        with tempfile.TemporaryDirectory() as root:
+            settings = dict(benchSettings, practiceMode="multiple choice")
+            for user in range(users):
+                vocab = makeVocab(wordsPerUser, user)
+                for word in vocab:
+                    vocab[word]['streak'] = 0
+                os.makedirs(os.path.join(root, f"user{user}"))
+                saveJson(vocab, os.path.join(root, f"user{user}", 'vocab.json'))
+
+            manager = DeckManager(settings, root, maxDecks=slots)
+            latencies = []
+            start = threading.Barrier(users)
+
+            def answer(userId):
+                rng = random.Random(userId)
+                start.wait()
+                answered = 0
+                while answered < answersPerUser:
+                    with manager.deck(userId) as store:
+                        words = [question['word'] for question in engine.planRound(store)]
+                    for word in words[:answersPerUser - answered]:
+                        began = time.perf_counter()
+                        with manager.deck(userId) as store:
+                            engine.startQuestion(store, word)
+                            question = engine.buildQuestion(store, word, "multiple choice")
+                            choice = question['answers'].index(store.vocab[word]['word']) + 1
+                            vWord = store.vocab[word]
+                            engine.gradeAnswer(vWord, engine.isCorrectAnswer(store, question, str(choice)))
+                            store.saveWord(word, vWord)
+                        latencies.append(time.perf_counter() - began)
+                        answered += 1
+                        time.sleep(rng.uniform(0, 0.002))
+
+            threads = [threading.Thread(target=answer, args=(f"user{user}",)) for user in range(users)]
+            began = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+            manager.closeAll()
+
+            streaks = sum(vWord['streak'] for user in range(users)
+                          for vWord in loadJson(os.path.join(root, f"user{user}", 'vocab.json')).values())
+            latencies.sort()
+            answers = users * answersPerUser
+            print(f"{users:>5} users {slots:>4} slots {answers:>6} answers {answers / elapsed:>7.0f} answers/s   "
+                  f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms   "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms   "
+                  f"write-backs {manager.evictions}   lost updates {answers - streaks}")
+
+
+# For each size, writes a log of that many random answers spread over 90
+# days, reads it back and replays it through the scoring rules. The numpy
+# replay must give the same scores as the review by review one.
+def benchReplay(sizes=(100000, 1000000)):
+    for size in sizes:
+        rng = random.Random(0)
+        words = max(size // 50, 1)
+        with tempfile.TemporaryDirectory() as folder:
+            log = ReviewLog(os.path.join(folder, 'vocab.reviews'), syncEvery=size)
+            start = time.time()
+            now = start - 90 * 24 * 3600
+            for _ in range(size):
+                now += rng.expovariate(size / (90 * 24 * 3600))
+                log.record(f"word{rng.randrange(words)}", now, "multiple choice", rng.random() < 0.75, rng.uniform(1, 5))
+            log.close()
+            printResult("log writes per review", size, (time.time() - start) / size)
+            logSize = os.path.getsize(log.file)
+            print(f"{'log size':<40} {size:>9} reviews {logSize / size:>10.1f} B/review")
+            printResult("read log", size, timeIt(lambda: readReviews(log.file)))
+            _, reviews = readReviews(log.file)
+        settings = dict(practice.defaultSettings)
+        printResult("replay", size, timeIt(lambda: simulator.replayScores(reviews, settings)))
+        sample = reviews[:min(size, 100000)] if simulator.numpy is not None else reviews
+        fast = simulator.replayScores(sample, settings)
+        printResult("replay review by review", len(sample), timeIt(lambda: simulator._replayPython(sample, settings, 0.7)))
+        slow = simulator._replayPython(sample, settings, 0.7)
+        print(f"{'scores differing from engine replay':<40} {len(sample):>9} reviews "
+              f"{sum(float(a) != float(b) for a, b in zip(fast, slow)):>10}")
+
+
+# How long the user waits between answering and seeing the next question,
+# with the question built and the answer saved in series, and with the round
+# planned up front and answers saved by RoundPipeline while the user thinks
+# (thinkSeconds per question). Every save is synced to disk.
+def benchPipeline(sizes=(10000, 100000), thinkSeconds=0.02):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            saveJson(makeVocab(size), os.path.join(root, 'vocab.json'))
+            settings = dict(benchSettings, journalSyncEvery=1, practiceMode="multiple choice")
+            store = JsonStore(settings, os.path.join(root, 'vocab.json'), os.path.join(root, 'vocab.journal'))
+            store.load()
+            for pipelined in (False, True):
+                started = time.perf_counter()
+                questions = engine.planRound(store)
+                planned = time.perf_counter() - started
+                pipeline = RoundPipeline(store) if pipelined else None
+                waits = []
+                for question in questions:
+                    word = question['word']
+                    began = time.perf_counter()
+                    if not pipelined:
+                        question = engine.buildQuestion(store, word, engine.chooseGame(settings))
+                    waits.append(time.perf_counter() - began)
+                    time.sleep(thinkSeconds)
+                    began = time.perf_counter()
+                    with pipeline.lock if pipelined else threading.Lock():
+                        vWord = engine.startQuestion(store, word)
+                        engine.gradeAnswer(vWord, vWord['word'] in question['answers'])
+                    if pipelined:
+                        pipeline.save(word)
+                    else:
+                        store.saveWord(word, vWord)
+                    waits[-1] += time.perf_counter() - began
+                if pipelined:
+                    pipeline.close()
+                name = "pipelined" if pipelined else "in series"
+                printResult("plan round", size, planned)
+                printResult(f"wait after answer, {name}", size, sum(waits) / len(waits))
+            store.close()
+
+
+# Rounds are reproducible under a seed, and repeats of a word are never
+# adjacent when the round has room to space them.
+def benchRounds(size=10000, rounds=1000):
+    store = JsonStore(dict(benchSettings, practiceMode="random"))
+    store.vocab = compactVocab(makeVocab(size))
+    store.reindex()
+    store._rebuildIndexes()
+    now = time.time()
+    words = lambda questions: [question['word'] for question in questions]
+    printResult("plan round", size, timeIt(lambda: engine.planRound(store, now=now), 100))
+    same = sum(engine.planRound(store, now=now, seed=seed) == engine.planRound(store, now=now, seed=seed)
+               for seed in range(100))
+    print(f"{'same round for same seed':<40} {size:>9} words {same:>9}/100")
+    adjacent = 0
+    for seed in range(rounds):
+        planned = words(engine.planRound(store, now=now, seed=seed))
+        adjacent += sum(a == b for a, b in zip(planned, planned[1:]))
+    print(f"{'adjacent repeats':<40} {size:>9} words {adjacent:>12}")
+    # every arrangement of 3 copies of 3 words equally likely
+    counts = {}
+    rng = random.Random(0)
+    for _ in range(60000):
+        key = tuple(engine.shuffleList(list("aaabbbccc"), rng))
+        counts[key] = counts.get(key, 0) + 1
+    expected = 60000 / 1680
+    chiSquare = sum((count - expected) ** 2 / expected for count in counts.values()) + (1680 - len(counts)) * expected
+    print(f"{'shuffle chi-square (1679 dof)':<40} {'':>9} {chiSquare:>18.0f}")
+
+
+# The whole edit distance table, counting swaps of neighbouring characters
+# as one edit if swaps is set.
+def editDistance(a, b, swaps=False):
+    beforePrevious = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if swaps and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, beforePrevious[j - 2] + 1)
+            current.append(cost)
+        beforePrevious, previous = previous, current
+    return previous[-1]
+
+
+# Words within the allowed typos of a query (see SearchIndex.fuzzy) that the
+# search index misses, found by comparing against every word, while words
+# are added, edited and deleted. Every match is ranked here.
+def checkSearch(size=2000, steps=300, seed=0):
+    rng = random.Random(seed)
+    vocab = makeVocab(size, seed)
+    useDeck(vocab)
+    store = practice.store
+    store.searchWords('')
+    maxRanked = searchindex.maxRanked
+    searchindex.maxRanked = size * 2
+    misses = 0
+    for step in range(steps):
+        word = rng.choice(list(vocab))
+        if rng.random() < 0.1:
+            del vocab[word]
+            store._unindexWord(word)
+        else:
+            if rng.random() < 0.5:
+                word = f"new{step}"
+                vocab[word] = dict(vocab[rng.choice(list(vocab))])
+            vocab[word]['word'] = ''.join(rng.choice('abcdefgh') for _ in range(rng.randint(4, 14)))
+            store._indexWord(word, vocab[word])
+        text = list(vocab[rng.choice(list(vocab))]['word'])
+        text[rng.randrange(len(text))] = rng.choice('abcdefgh')
+        text = ''.join(text)
+        expected = set(w for w in vocab if editDistance(text, vocab[w]['word']) <= 1 + len(text) // 10)
+        misses += len(expected - set(store.search.fuzzy(text, len(vocab))))
+    searchindex.maxRanked = maxRanked
+    return misses
+
+
+def benchSearch(sizes=(10000, 100000, 1000000)):
+    for size in sizes:
+        vocab = makeVocab(size)
+        useDeck(vocab)
+        store = practice.store
+        now = time.time()
+        printResult("search index build", size, timeIt(lambda: store.searchWords('')))
+        printResult("prefix search", size, timeIt(lambda: store.searchWords('translation12'), 100))
+        printResult("search with a typo", size, timeIt(lambda: store.searchWords('transaltion1234'), 100))
+        printResult("search with no match", size, timeIt(lambda: store.searchWords('qwertyuiop'), 100))
+        words = random.Random(3).sample(list(vocab), 100)
+
+        def editWord():
+            word = words.pop()
+            vocab[word]['word'] += ' edited'
+            store._indexWord(word, vocab[word])
+        printResult("edit a translation", size, timeIt(editWord, 50))
+        engine.getWordListLayout(store, now)
+        printResult("jump to a match", size, timeIt(
+            lambda: engine.getWordLine(store, store.searchWords('translation4321')[0], now), 100))
+
+
+# A translation with typos: characters changed, dropped, added or swapped.
+def misspell(rng, text, typos):
+    text = list(text)
+    for _ in range(typos):
+        i = rng.randrange(len(text))
+        action = rng.randrange(4)
+        if action == 0:
+            text[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        elif action == 1 and len(text) > 1:
+            del text[i]
+        elif action == 2:
+            text.insert(i, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+        elif i + 1 < len(text):
+            text[i], text[i + 1] = text[i + 1], text[i]
+    return ''.join(text)
+
+
+# Random pairs whose bounded distance differs from the full table's.
+def checkGrading(pairs=20000, seed=0):
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(pairs):
+        a = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 10)))
+        b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 10)))
+        maxDistance = rng.randint(0, 4)
+        mismatches += grading.boundedDistance(a, b, maxDistance) != min(editDistance(a, b, True), maxDistance + 1)
+    return mismatches
+
+
+def benchGrading(answers=100000):
+    rng = random.Random(0)
+    vocab = makeVocab(10000)
+    useDeck(vocab)
+    store = practice.store
+    words = list(vocab)
+    submissions = []
+    for _ in range(answers):
+        word = rng.choice(words)
+        submissions.append(({'word': word, 'game': "typed"}, misspell(rng, vocab[word]['word'], rng.randint(0, 3))))
+    right = sum(engine.isCorrectAnswer(store, question, answer) for question, answer in submissions)
+    print(f"{'typed answers accepted':<40} {answers:>9} answers {right / answers:>10.1%}")
+    seconds = timeIt(lambda: [engine.isCorrectAnswer(store, question, answer) for question, answer in submissions])
+    print(f"{'typed answers graded per second':<40} {answers:>9} answers {answers / seconds:>12.0f}")
+    seconds = timeIt(lambda: [editDistance(grading.foldAnswer(answer), grading.foldAnswer(vocab[question['word']]['word']),
+                                           True) for question, answer in submissions[:10000]])
+    print(f"{'full edit distance per second':<40} {10000:>9} answers {10000 / seconds:>12.0f}")
+
+
+# A learner who keeps taking one other word for each of some words: how often
+# that word is then among the wrong answers, what it costs per question, and
+# recording, reloading and compacting the matrix on disk.
+def benchConfusions(size=100000, confused=1000, answers=100000):
+    rng = random.Random(0)
+    store = JsonStore(dict(benchSettings, practiceMode="multiple choice"))
+    store.vocab = compactVocab(makeVocab(size))
+    store.reindex()
+    store._rebuildIndexes()
+    words = list(store.vocab)
+    # the most due words, so rounds have them
+    partners = dict(zip(store.practiceWords(confused, time.time()), rng.sample(words, confused)))
+    partners = dict((word, other) for word, other in partners.items() if word != other)
+    asked = list(partners) * 10
+
+    def partnerShare():
+        shown = sum(partners[word] in engine.buildQuestion(store, word, "multiple choice", rng)['answerWords'].values()
+                    for word in asked)
+        return shown / len(asked)
+    before = partnerShare()
+    perQuestion = timeIt(lambda: [engine.buildQuestion(store, word, "multiple choice", rng) for word in asked])
+    for word, other in partners.items():
+        for _ in range(3):
+            store.logReview(word, "multiple choice", False, 1.0, confusedWith=other)
+    print(f"{'confused word shown, before':<40} {len(asked):>9} questions {before:>8.1%}")
+    print(f"{'confused word shown, after':<40} {len(asked):>9} questions {partnerShare():>8.1%}")
+    printResult("per question, no confusions", size, perQuestion / len(asked))
+    printResult("per question, with confusions", size,
+                timeIt(lambda: [engine.buildQuestion(store, word, "multiple choice", rng) for word in asked])
+                / len(asked))
+    store.settings['numPracticeWords'] = 8
+    paired = 0
+    for seed in range(100):
+        planned = set(question['word'] for question in engine.planRound(store, seed=seed))
+        paired += sum(partners.get(word) in planned for word in planned)
+    print(f"{'confused pairs per round':<40} {100:>9} rounds {paired / 100:>10.2f}")
+
+    with tempfile.TemporaryDirectory() as folder:
+        file = os.path.join(folder, 'vocab.confusions')
+        matrix = ConfusionMatrix(file)
+        pairs = [(rng.choice(words), rng.choice(words)) for _ in range(answers)]
+        printResult("record wrong answer", answers,
+                    timeIt(lambda: [matrix.record(word, other) for word, other in pairs]) / answers)
+        rows = dict((word, dict(row)) for word, row in matrix.rows.items())
+        matrix.close()
+        print(f"{'file size':<40} {answers:>9} answers {os.path.getsize(file) / 1024:>10.0f} KiB")
+        with open(file, 'a') as f:
+            f.write('["word1", "wo')
+        reloaded = ConfusionMatrix(file)
+        printResult("reload", answers, timeIt(lambda: len(reloaded)))
+        print(f"{'rows equal after reload':<40} {answers:>9} answers {str(reloaded.rows == rows):>12}")
+        # the same few pairs over and over, which compaction keeps at one line each
+        file = os.path.join(folder, 'hot.confusions')
+        hot = ConfusionMatrix(file)
+        printResult("record repeated pairs", answers,
+                    timeIt(lambda: [hot.record(word, other) for word, other in pairs[:100] * (answers // 100)]) / answers)
+        rows = dict((word, dict(row)) for word, row in hot.rows.items())
+        hot.close()
+        print(f"{'file size after compaction':<40} {answers:>9} answers {os.path.getsize(file) / 1024:>10.0f} KiB")
+        compacted = ConfusionMatrix(file)
+        print(f"{'rows equal after compaction':<40} {answers:>9} answers {str(len(compacted) and compacted.rows == rows):>12}")
+
+
+# Cost of the metrics hooks per call, off and on, next to a bare call.
+def benchMetrics(calls=1000000):
+    def bare():
+        pass
+
+    timedBare = metrics.timed('bench')(bare)
+
+    def withPhase():
+        with metrics.phase('bench'):
+            pass
+
+    def perCall(func):
+        return timeIt(lambda: [func() for _ in range(calls)]) / calls
+
+    wasEnabled = metrics.enabled
+    for state in (False, True):
+        metrics.enabled = state
+        label = "on" if state else "off"
+        print(f"{'bare call':<20} {label:<4} {perCall(bare) * 1e9:>10.0f} ns")
+        print(f"{'timed call':<20} {label:<4} {perCall(timedBare) * 1e9:>10.0f} ns")
+        print(f"{'phase block':<20} {label:<4} {perCall(withPhase) * 1e9:>10.0f} ns")
+    metrics.enabled = wasEnabled
+    metrics.reset()
+
+
+# Requests per second for static files, from a local load generator: clients
+# threads with keep-alive connections, each fetching the page's assets in a
+# loop. Runs against the old send_from_directory route and the in-memory
+# assets, once as a first visit and once revalidating with If-None-Match.
+def benchServer(clients=8, seconds=3):
+    import flask
+    import logging
+    import app
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    legacyApp = flask.Flask('legacy', root_path=app.app.root_path)
+
+    @legacyApp.route('/<path:path>')
+    def legacyStatic(path):
+        return flask.send_from_directory('static', path)
+
+    paths = ['/index.html', '/css/bootstrap.min.css', '/css/appStyle.css', '/js/jquery-3.6.3.min.js',
+             '/js/bootstrap.min.js', '/js/app.js']
+    for name, wsgiApp in (("send_from_directory", legacyApp), ("in-memory assets", app.app)):
+        server = make_server('127.0.0.1', 0, wsgiApp, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        for revalidate in (False, True):
+            counts = []
+            sent = []
+
+            def load():
+                conn = http.client.HTTPConnection('127.0.0.1', server.port)
+                etags = {}
+                count = size = 0
+                end = time.perf_counter() + seconds
+                while time.perf_counter() < end:
+                    for path in paths:
+                        headers = {'Accept-Encoding': 'gzip, br'}
+                        if revalidate and path in etags:
+                            headers['If-None-Match'] = etags[path]
+                        conn.request('GET', path, headers=headers)
+                        response = conn.getresponse()
+                        size += len(response.read())
+                        if response.getheader('ETag'):
+                            etags[path] = response.getheader('ETag')
+                        count += 1
+                counts.append(count)
+                sent.append(size)
+                conn.close()
+
+            threads = [threading.Thread(target=load) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            kind = "revalidate" if revalidate else "first visit"
+            print(f"{name:<20} {kind:<12} {sum(counts) / seconds:>8.0f} req/s "
+                  f"{sum(sent) / max(sum(counts), 1) / 1024:>8.1f} KiB/response")
+        server.shutdown()
+
+
+benchmarks = {
+    "scheduler": benchScheduler,
+    "distractors": benchDistractors,
+    "scores": benchScores,
+    "wordlist": benchWordList,
+    "views": benchViews,
+    "ordering": benchOrdering,
+    "records": benchRecords,
+    "snapshot": benchSnapshot,
+    "startup": benchStartup,
+    "decks": benchDecks,
+    "replay": benchReplay,
+    "metrics": benchMetrics,
+    "pipeline": benchPipeline,
+    "rounds": benchRounds,
+    "search": benchSearch,
+    "grading": benchGrading,
+    "confusions": benchConfusions,
+    "server": benchServer,
+}
+
+# Each returns how many results differ from the reference; any is a failure.
+checks = {
+    "scores": checkScores,
+    "ordering": checkOrdering,
+    "search": checkSearch,
+    "grading": checkGrading,
+}
+
+
+# Runs the given checks and returns how many failed.
+def runChecks(names):
+    failed = 0
+    for name in names:
+        mismatches = checks[name]()
+        print(f"{name:<40} {mismatches:>12} mismatches {'FAILED' if mismatches else 'ok':>8}")
+        failed += mismatches > 0
+    return failed
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(benchmarks)
+    if names[0] == 'check':
+        sys.exit(1 if runChecks(names[1:] or list(checks)) else 0)
+    for name in names:
+        print(f"== {name} ==")
+        benchmarks[name]()
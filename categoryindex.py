@@ -0,0 +1,72 @@
+import random
+
+
+# Word keys grouped by category, kept current as words are added, edited and
+# removed. Lists use swap-remove so every update and sample is O(1).
+class CategoryIndex:
+    def __init__(self):
+        self.categories = {}
+        self.allWords = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.allWords)
+
+    def rebuild(self, vocab):
+        self.categories = {}
+        self.allWords = []
+        self.positions = {}
+        for word in vocab:
+            self.update(word, vocab[word]['category'])
+
+    def update(self, word, category):
+        if word in self.positions:
+            if self.positions[word][0] == category:
+                return
+            self.remove(word)
+        members = self.categories.setdefault(category, [])
+        self.positions[word] = (category, len(members), len(self.allWords))
+        members.append(word)
+        self.allWords.append(word)
+
+    def remove(self, word):
+        position = self.positions.pop(word, None)
+        if position is None:
+            return
+        category, categoryIndex, allIndex = position
+        members = self.categories[category]
+        self._swapRemove(members, categoryIndex, 1)
+        self._swapRemove(self.allWords, allIndex, 2)
+        if not members:
+            del self.categories[category]
+
+    # Up to count distinct words other than word, preferring its category and
+    # topping up from the rest of the deck.
+    def sample(self, word, category, count, rng=random):
+        members = self.categories.get(category, [])
+        picked = self._sampleFrom(members, count, lambda w: w != word, rng)
+        if len(picked) < count and len(self.allWords) > len(members):
+            picked.extend(self._sampleFrom(self.allWords, count - len(picked),
+                                           lambda w: self.positions[w][0] != category, rng))
+        return picked
+
+    def _sampleFrom(self, words, count, accept, rng):
+        picked = []
+        if count * 4 >= len(words):
+            candidates = [w for w in words if accept(w)]
+            return rng.sample(candidates, min(count, len(candidates)))
+        attempts = 0
+        while len(picked) < count and attempts < count * 16:
+            attempts += 1
+            w = rng.choice(words)
+            if accept(w) and w not in picked:
+                picked.append(w)
+        return picked
+
+    def _swapRemove(self, words, index, slot):
+        last = words.pop()
+        if index < len(words):
+            words[index] = last
+            position = list(self.positions[last])
+            position[slot] = index
+            self.positions[last] = tuple(position)
@@ -0,0 +1,143 @@
+import os
+import json
+import random
+
+# Words kept per row; a new one replaces the least confused.
+maxPerWord = 8
+# Chance that a distractor slot goes to a word from the row, when it has one.
+confusedShare = 0.5
+
+
+# Which words the user took for which: rows[word] maps each word whose
+# translation was picked for word in a wrong answer to how often that
+# happened. Rows are small dicts, so every lookup is O(1), and only words
+# with mix-ups have one.
+#
+# Kept apart from the deck in its own append-only file (one JSON line
+# [word, other, count] per change, or [word, null] when word was deleted),
+# rewritten from the rows once it is mostly superseded lines. With no file
+# the rows only live in memory. The file is read on first use.
+class ConfusionMatrix:
+    def __init__(self, file=None, syncEvery=64):
+        self.file = file
+        self.syncEvery = syncEvery
+        self.unsynced = 0
+        self.lines = 0
+        self.pairs = 0
+        self.f = None
+        self.rows = None
+
+    def __len__(self):
+        self._load()
+        return self.pairs
+
+    def record(self, word, other, count=1):
+        self._load()
+        self._add(word, other, count)
+        self._write([word, other, count])
+
+    # Drops the row of a deleted word.
+    def forget(self, word):
+        self._load()
+        row = self.rows.pop(word, None)
+        if row is not None:
+            self.pairs -= len(row)
+            self._write([word, None])
+
+    def row(self, word):
+        self._load()
+        return self.rows.get(word, {})
+
+    # The word most often taken for word, or None.
+    def mostConfused(self, word):
+        row = self.row(word)
+        return max(row, key=row.get) if row else None
+
+    # Words from word's row for about confusedShare of count slots, drawn
+    # with rng by how often each was taken for it.
+    def pick(self, word, count, rng=random):
+        row = self.row(word)
+        if not row:
+            return []
+        slots = sum(rng.random() < confusedShare for _ in range(count))
+        others = list(row)
+        weights = list(row.values())
+        picked = []
+        while others and len(picked) < slots:
+            i = rng.choices(range(len(others)), weights)[0]
+            picked.append(others.pop(i))
+            weights.pop(i)
+        return picked
+
+    def sync(self):
+        if self.unsynced:
+            os.fsync(self.f.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        if self.f is not None:
+            self.sync()
+            self.f.close()
+            self.f = None
+
+    def _load(self):
+        if self.rows is not None:
+            return
+        self.rows = {}
+        if self.file is None or not os.path.exists(self.file):
+            return
+        size = 0
+        with open(self.file, 'rb') as f:
+            for line in f:
+                # a torn last line from a crash mid-write is cut off below
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break
+                size += len(line)
+                self.lines += 1
+                if change[1] is None:
+                    self.pairs -= len(self.rows.pop(change[0], {}))
+                else:
+                    self._add(*change)
+        if os.path.getsize(self.file) != size:
+            with open(self.file, 'r+b') as f:
+                f.truncate(size)
+
+    def _add(self, word, other, count):
+        row = self.rows.setdefault(word, {})
+        if other not in row:
+            if len(row) >= maxPerWord:
+                del row[min(row, key=row.get)]
+            else:
+                self.pairs += 1
+        row[other] = row.get(other, 0) + count
+
+    def _write(self, change):
+        if self.file is None:
+            return
+        if self.f is None:
+            self.f = open(self.file, 'a', encoding='utf-8')
+        self.f.write(json.dumps(change) + '\n')
+        self.f.flush()
+        self.lines += 1
+        self.unsynced += 1
+        if self.lines > 4 * self.pairs + 1024:
+            self._compact()
+        elif self.unsynced >= self.syncEvery:
+            self.sync()
+
+    # Rewrites the file as one line per pair, to a temp file renamed over it.
+    def _compact(self):
+        self.close()
+        tmpFile = self.file + '.tmp'
+        with open(tmpFile, 'w', encoding='utf-8') as f:
+            for word, row in self.rows.items():
+                for other, count in row.items():
+                    f.write(json.dumps([word, other, count]) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpFile, self.file)
+        self.lines = self.pairs
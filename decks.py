@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from storage import openStore
+
+userIdPattern = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+# One user's deck: its store, the lock every read and write of it holds, and
+# how many requests are using it right now. previous is the evicted deck of the
+# same user, if it was still being written back when this one was opened.
+class Deck:
+    def __init__(self, userId, store, previous=None):
+        self.userId = userId
+        self.store = store
+        self.previous = previous
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.closed = threading.Event()
+        self.users = 0
+        self.lastUsed = time.time()
+
+
+# Keeps the decks of many users in memory at once, each in its own folder
+# under root (decks/<user>/vocab.json and friends) with its own copy of the
+# settings. folders gives other folders for some users, like the terminal
+# app's deck for the default user. Only deck(userId, create=True) makes a new
+# deck, and at most maxCreated of them live under root. Requests for different users never wait on each other; requests
+# for the same user are serialized by the deck lock. Once more than maxDecks
+# are open the least recently used idle ones are closed, which writes back
+# anything not yet in their snapshot.
+class DeckManager:
+    def __init__(self, settings, root='decks', maxDecks=64, folders=None, maxCreated=1000):
+        self.settings = settings
+        self.root = root
+        self.folders = folders or {}
+        self.maxCreated = maxCreated
+        self.created = len(os.listdir(root)) if os.path.isdir(root) else 0
+        self.maxDecks = maxDecks
+        self.decks = OrderedDict()
+        self.closing = {}
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    # with manager.deck(userId) as store: ... runs with that user's deck locked.
+    # Raises KeyError for a user with no deck unless create is set, and
+    # ValueError if that would make more than maxCreated decks.
+    @contextmanager
+    def deck(self, userId, create=False):
+        deck = self._acquire(userId, create)
+        try:
+            with deck.lock:
+                if not deck.loaded:
+                    if deck.previous is not None:
+                        deck.previous.closed.wait()
+                        deck.previous = None
+                    deck.store.load()
+                    deck.loaded = True
+                yield deck.store
+        finally:
+            self._release(deck)
+
+    # Closes decks that have not been used for maxIdle seconds.
+    def evictIdle(self, maxIdle):
+        cutoff = time.time() - maxIdle
+        with self.lock:
+            idle = [deck for deck in self.decks.values() if deck.users == 0 and deck.lastUsed < cutoff]
+            for deck in idle:
+                self._detach(deck)
+        for deck in idle:
+            self._close(deck)
+        return len(idle)
+
+    def closeAll(self):
+        with self.lock:
+            decks = list(self.decks.values())
+            for deck in decks:
+                self._detach(deck)
+        for deck in decks:
+            self._close(deck)
+
+    def exists(self, userId):
+        return userId in self.folders or userId in self.decks or os.path.isdir(os.path.join(self.root, userId))
+
+    def _acquire(self, userId, create):
+        if not isinstance(userId, str) or not userIdPattern.match(userId):
+            raise ValueError(f"Invalid user id '{userId}'.")
+        with self.lock:
+            deck = self.decks.get(userId)
+            if deck is None:
+                folder = self.folders.get(userId) or os.path.join(self.root, userId)
+                if not os.path.isdir(folder):
+                    if not create:
+                        raise KeyError(userId)
+                    if userId not in self.folders:
+                        if self.created >= self.maxCreated:
+                            raise ValueError("Too many decks.")
+                        self.created += 1
+                    os.makedirs(folder, exist_ok=True)
+                store = openStore(dict(self.settings), folder)
+                deck = self.decks[userId] = Deck(userId, store, self.closing.get(userId))
+            else:
+                self.decks.move_to_end(userId)
+            deck.users += 1
+            evicted = self._evictOverflow()
+        for old in evicted:
+            self._close(old)
+        return deck
+
+    def _release(self, deck):
+        with self.lock:
+            deck.users -= 1
+            deck.lastUsed = time.time()
+            evicted = self._evictOverflow()
+        for old in evicted:
+            self._close(old)
+
+    # Called with self.lock held. Decks in use are skipped and evicted later.
+    def _evictOverflow(self):
+        evicted = []
+        if len(self.decks) <= self.maxDecks:
+            return evicted
+        for deck in list(self.decks.values()):
+            if len(self.decks) <= self.maxDecks:
+                break
+            if deck.users == 0:
+                self._detach(deck)
+                evicted.append(deck)
+        return evicted
+
+    # Called with self.lock held.
+    def _detach(self, deck):
+        del self.decks[deck.userId]
+        self.closing[deck.userId] = deck
+
+    def _close(self, deck):
+        with deck.lock:
+            if deck.loaded:
+                deck.store.close()
+        deck.closed.set()
+        with self.lock:
+            self.evictions += 1
+            if self.closing.get(deck.userId) is deck:
+                del self.closing[deck.userId]
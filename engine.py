@@ -0,0 +1,284 @@
+import time
+import random
+import metrics
+import grading
+from exporter import deckStats
+from ordering import DeckOrder
+
+# Practice rules shared by the terminal app and the web API. Nothing here reads
+# globals or files; every function gets the store (deck) it works on.
+
+# A wrong answer keeps this much of the word's score.
+wrongAnswerMultiplier = 0.7
+
+
+def adjustScoreBasedOnTime(vWord, settings, now=None):
+    if now is None:
+        now = time.time()
+    scoreDepletionRate = 1
+    if vWord['streak'] > 0:
+        if vWord['streak'] >= settings['maxStreak']:
+            return vWord['score']
+        scoreDepletionRate = vWord['streak'] / settings['maxStreak']
+        scoreDepletionRate = 1 - scoreDepletionRate
+
+    nScore = vWord['score'] - \
+        int((((now - vWord['lastPracticed']) /
+            3600) / 2) * scoreDepletionRate)
+    if nScore < 0:
+        nScore = 0
+    return nScore
+
+
+# Favorites go last, or first in reverse order when reversed.
+def sortVocab(vocab, adjusted, reverse=False):
+    sortedV = sorted(vocab, key=adjusted.score, reverse=reverse)
+    favorites = [word for word in sortedV if vocab[word]['isFavorite']]
+    others = [word for word in sortedV if not vocab[word]['isFavorite']]
+    if reverse:
+        favorites.reverse()
+        return favorites + others
+    return others + favorites
+
+
+# How long a view built now stays right: until the next score decay step. On
+# big decks some score decays every few seconds, so views are kept for at
+# least listRefreshSeconds and shown scores may lag behind by that much.
+def viewValidUntil(store, now):
+    return max(store.nextScoreChange(now), now + store.settings.get('listRefreshSeconds', 60))
+
+
+# Words in list order, grouped by category, with the index where each group
+# starts. Valid until the store version changes or validUntil passes. This is
+# the from-scratch reference for the incremental DeckOrder.
+def buildWordListLayout(store, now, reverse=False):
+    adjusted = store.adjustScores(now)
+    sW = sortVocab(store.vocab, adjusted, reverse)
+    wordsByCategory = {}
+    for word in sW:
+        category = store.vocab[word]['category']
+        if category not in wordsByCategory:
+            wordsByCategory[category] = []
+        wordsByCategory[category].append(word)
+
+    words = []
+    groupStarts = []
+    for category in wordsByCategory:
+        groupStarts.append(len(words))
+        words.extend(wordsByCategory[category])
+
+    return {
+        'version': store.version,
+        'validUntil': viewValidUntil(store, now),
+        'adjusted': adjusted,
+        'words': words,
+        'groupStarts': groupStarts,
+        'categories': list(wordsByCategory),
+    }
+
+
+# The layout from the store's DeckOrder, which saved answers and edits update
+# in place. Only a score decay step makes it sort the deck again.
+def getWordListLayout(store, now=None, reverse=False):
+    if now is None:
+        now = time.time()
+    order = store.orders.get(reverse)
+    if order is None or now >= order.validUntil:
+        order = store.orders[reverse] = DeckOrder(
+            store.vocab, store.adjustScores(now), store.settings, now, viewValidUntil(store, now), reverse)
+    return order.layout(store.version)
+
+
+# Line of word in the word list, or -1 if it is not in the deck.
+def getWordLine(store, word, now=None, reverse=False):
+    layout = getWordListLayout(store, now, reverse)
+    return store.orders[reverse].index(word, layout)
+
+
+# The words of one category in list order, or all words for None.
+def getCategoryWords(store, category=None, now=None):
+    if now is None:
+        now = time.time()
+    layout = getWordListLayout(store, now)
+    if category is None:
+        return layout['words']
+
+    def build():
+        if category not in layout['categories']:
+            return [], layout['validUntil']
+        group = layout['categories'].index(category)
+        groupStarts = layout['groupStarts']
+        end = groupStarts[group + 1] if group + 1 < len(groupStarts) else len(layout['words'])
+        return layout['words'][groupStarts[group]:end], layout['validUntil']
+    return store.views.get(('category', category), store.version, now, build)
+
+
+def getDeckStats(store, now=None):
+    if now is None:
+        now = time.time()
+    return store.views.get(('stats',), store.version, now,
+                           lambda: (deckStats(store, now), viewValidUntil(store, now)))
+
+
+# Fisher-Yates, in place.
+def shuffleList(l, rng=random):
+    for i in range(len(l) - 1, 0, -1):
+        j = rng.randint(0, i)
+        l[i], l[j] = l[j], l[i]
+    return l
+
+
+# words in a random order with no word twice in a row, where that is possible.
+# Each position takes a word other than the last one, chosen with chance
+# proportional to how many of its copies are left, unless a word has so many
+# left that it must go now to still fit with gaps between its copies.
+def spaceRepeats(words, rng=random):
+    left = {}
+    for word in words:
+        left[word] = left.get(word, 0) + 1
+    spaced = []
+    previous = None
+    for position in range(len(words)):
+        remaining = len(words) - position
+        candidates = [word for word in left if word != previous]
+        if not candidates:
+            candidates = [previous]
+        forced = [word for word in candidates if left[word] * 2 > remaining]
+        if forced:
+            word = forced[0]
+        else:
+            word = rng.choices(candidates, [left[w] for w in candidates])[0]
+        spaced.append(word)
+        left[word] -= 1
+        if not left[word]:
+            del left[word]
+        previous = word
+    return spaced
+
+
+# A whole practice round, planned in one pass at one time, now: the question
+# (see buildQuestion) for every word of the round. That is every word once
+# for practiceAll, otherwise numPracticeWords words three times each with no
+# word twice in a row, some of them words the others were taken for (see
+# addConfusedWords). The same seed, deck and time give the same round.
+@metrics.timed('plan round')
+def planRound(store, practiceAll=False, now=None, seed=None):
+    if now is None:
+        now = time.time()
+    rng = random.Random(seed)
+    if practiceAll:
+        words = store.practiceWords(len(store.vocab), now)
+    else:
+        words = addConfusedWords(store, store.practiceWords(store.settings["numPracticeWords"], now))
+        words = spaceRepeats([word for word in words for _ in range(3)], rng)
+    return [buildQuestion(store, word, chooseGame(store.settings, rng), rng) for word in words]
+
+
+# Swaps up to a quarter of the words, the least due ones, for the words the
+# others were most often taken for, so a confused pair is practiced together.
+def addConfusedWords(store, words):
+    slots = len(words) // 4
+    chosen = set(words)
+    partners = []
+    for word in words[:len(words) - slots]:
+        if len(partners) >= slots:
+            break
+        other = store.confusions.mostConfused(word)
+        if other is not None and other not in chosen and other in store.vocab:
+            partners.append(other)
+            chosen.add(other)
+    return words[:len(words) - len(partners)] + partners
+
+
+def chooseGame(settings, rng=random):
+    if settings["practiceMode"] == "random":
+        return rng.choice(
+            ["multiple choice", "multiple choice", "true/false"])  # Bigger chance for multiple choice
+    return settings["practiceMode"]
+
+
+# Marks the word as being practiced: its decayed score becomes its real score.
+def startQuestion(store, word, now=None):
+    if now is None:
+        now = time.time()
+    vWord = store.vocab[word]
+    vWord["score"] = adjustScoreBasedOnTime(vWord, store.settings, now)
+    vWord['lastPracticed'] = now
+    return vWord
+
+
+# Multiple choice: up to 4 distinct translations, the right one among them,
+# and the words of the wrong ones (answerWords). True/false: one translation
+# to judge, whether "1" (true) or "2" (false) is the right choice and the
+# word of a wrong translation (shownWord). Typed: nothing but the word.
+@metrics.timed('build question')
+def buildQuestion(store, word, game, rng=random):
+    vWord = store.vocab[word]
+    question = {'word': word, 'game': game}
+    if game == "multiple choice":
+        answers = {vWord['word']: word}
+        for other, translation in store.distractors(word, 3, rng).items():
+            answers.setdefault(translation, other)
+        question['answers'] = shuffleList(list(answers), rng)
+        del answers[vWord['word']]
+        question['answerWords'] = answers
+    elif game == "true/false":
+        correctChoice = rng.choice(["1", "2"])
+        wrongAnswers = list(store.distractors(word, 1, rng).items())
+        if not wrongAnswers:
+            correctChoice = "1"
+        question['correctChoice'] = correctChoice
+        if correctChoice == "1":
+            question['shown'] = vWord['word']
+        else:
+            question['shownWord'], question['shown'] = wrongAnswers[0]
+    return question
+
+
+# The word whose translation was taken for the question's word in a wrong
+# answer (see isCorrectAnswer), or None. Typed answers are not matched
+# against other words.
+def confusedWith(question, answer):
+    if question['game'] == "multiple choice":
+        try:
+            choice = int(answer) - 1
+        except (TypeError, ValueError):
+            return None
+        if 0 <= choice < len(question['answers']):
+            return question.get('answerWords', {}).get(question['answers'][choice])
+    elif question['game'] == "true/false":
+        if answer == "1" and question['correctChoice'] == "2":
+            return question.get('shownWord')
+    return None
+
+
+# answer is the 1-based choice number for multiple choice, "1" (true) or
+# "2" (false) for true/false, and the translation for typed, which may have a
+# few typos (see grading.py).
+def isCorrectAnswer(store, question, answer):
+    translation = store.vocab[question['word']]['word']
+    if question['game'] == "multiple choice":
+        try:
+            choice = int(answer) - 1
+        except (TypeError, ValueError):
+            return False
+        return 0 <= choice < len(question['answers']) and question['answers'][choice] == translation
+    elif question['game'] == "true/false":
+        return answer == question['correctChoice']
+    elif question['game'] == "typed":
+        return isinstance(answer, str) and grading.isCloseEnough(answer, translation)
+    return False
+
+
+# Updates the score and streak, and the scheduling state when a policy is
+# given (store.policy). multiplier is only changed by the replay simulator.
+def gradeAnswer(vWord, isGoodAnswer, policy=None, now=None, multiplier=wrongAnswerMultiplier):
+    if policy is not None:
+        policy.review(vWord, isGoodAnswer, time.time() if now is None else now)
+    if isGoodAnswer:
+        vWord['streak'] += 1
+        vWord['score'] += 1
+    else:
+        vWord['streak'] = 0
+        vWord['score'] *= multiplier
+        vWord['score'] = int(vWord['score'])
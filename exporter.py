@@ -0,0 +1,109 @@
+import csv
+import json
+import time
+
+exportColumns = ['word', 'translation', 'category', 'isFavorite', 'lastPracticed', 'score', 'streak']
+
+
+def guessFormat(file):
+    if file.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def exportRow(word, vWord):
+    return {
+        'word': word,
+        'translation': vWord['word'],
+        'category': vWord['category'],
+        'isFavorite': vWord['isFavorite'],
+        'lastPracticed': vWord['lastPracticed'],
+        'score': vWord['score'],
+        'streak': vWord['streak'],
+    }
+
+
+# Writes the deck one word per line, as CSV (readable by the import command) or
+# JSON Lines. Returns the number of words written.
+def exportFile(vocab, file, fmt=None):
+    fmt = fmt or guessFormat(file)
+    with open(file, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'jsonl':
+            for word in vocab:
+                f.write(json.dumps(exportRow(word, vocab[word]), ensure_ascii=False) + '\n')
+        else:
+            writer = csv.DictWriter(f, fieldnames=exportColumns)
+            writer.writeheader()
+            for word in vocab:
+                writer.writerow(exportRow(word, vocab[word]))
+    return len(vocab)
+
+
+def getStreakBuckets(maxStreak):
+    edges = [edge for edge in (1, 5, 10, 20) if edge < maxStreak] + [maxStreak]
+    labels = ['0']
+    for low, high in zip(edges, edges[1:]):
+        labels.append(f"{low}-{high - 1}" if high - 1 > low else f"{low}")
+    labels.append(f"{maxStreak}+")
+    return edges, labels
+
+
+# Per-category aggregates computed in a single pass over the deck: word count,
+# mean adjusted score, streak distribution and how many words are due now,
+# within an hour and within a day.
+def deckStats(store, now=None):
+    if now is None:
+        now = time.time()
+    settings = store.settings
+    adjusted = store.adjustScores(now)
+    edges, labels = getStreakBuckets(settings['maxStreak'])
+    categories = {}
+    for word, vWord in store.entries():
+        stats = categories.get(vWord['category'])
+        if stats is None:
+            stats = categories[vWord['category']] = {
+                'count': 0, 'scoreTotal': 0, 'favorites': 0,
+                'streaks': [0] * len(labels), 'dueNow': 0, 'dueHour': 0, 'dueDay': 0,
+            }
+        stats['count'] += 1
+        stats['scoreTotal'] += adjusted.score(word)
+        stats['favorites'] += bool(vWord['isFavorite'])
+        bucket = 0
+        while bucket < len(edges) and vWord['streak'] >= edges[bucket]:
+            bucket += 1
+        stats['streaks'][bucket] += 1
+        dueTime = store.policy.dueTime(vWord)
+        if dueTime <= now + 3600 * 24:
+            stats['dueDay'] += 1
+            if dueTime <= now + 3600:
+                stats['dueHour'] += 1
+                if dueTime <= now:
+                    stats['dueNow'] += 1
+
+    report = {}
+    for category in sorted(categories):
+        stats = categories[category]
+        report[category] = {
+            'count': stats['count'],
+            'meanScore': round(stats['scoreTotal'] / stats['count'], 2),
+            'favorites': stats['favorites'],
+            'streaks': dict(zip(labels, stats['streaks'])),
+            'dueNow': stats['dueNow'],
+            'dueHour': stats['dueHour'],
+            'dueDay': stats['dueDay'],
+        }
+    return report
+
+
+def printStats(report):
+    if not report:
+        print("The deck is empty.")
+        return
+    labels = list(next(iter(report.values()))['streaks'])
+    header = f"{'category':<16}{'words':>8}{'score':>7}{'due':>7}{'1h':>7}{'24h':>7}  streaks " + " ".join(labels)
+    print(header)
+    print('-' * len(header))
+    for category, stats in report.items():
+        streaks = " ".join(f"{stats['streaks'][label]:>{len(label)}}" for label in labels)
+        print(f"{category[:15]:<16}{stats['count']:>8}{stats['meanScore']:>7}{stats['dueNow']:>7}"
+              f"{stats['dueHour']:>7}{stats['dueDay']:>7}          {streaks}")
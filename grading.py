@@ -0,0 +1,85 @@
+import functools
+import unicodedata
+
+# One typo is forgiven for every this many characters of the translation.
+charsPerTypo = 5
+
+
+# The answer as it is compared: lowercase, without spaces or punctuation,
+# and letters with accents without them, so "Café au lait!" and "cafeaulait"
+# are the same answer. Marks typed on their own, as in Thai, are kept.
+@functools.lru_cache(maxsize=65536)
+def foldAnswer(text):
+    folded = []
+    for c in text.lower():
+        if c.isalnum() or unicodedata.combining(c):
+            decomposed = unicodedata.normalize('NFKD', c)
+            if len(decomposed) > 1:
+                folded += (d for d in decomposed if not unicodedata.combining(d))
+            else:
+                folded.append(c)
+    return ''.join(folded)
+
+
+# Edit distance between a and b, counting insertions, deletions,
+# substitutions and swaps of two neighbouring characters, or maxDistance + 1
+# as soon as it is known to be more. Only the band of the table within
+# maxDistance of the diagonal is filled in, a row at a time, and a row with
+# nothing left within maxDistance ends it.
+def boundedDistance(a, b, maxDistance):
+    if a == b:
+        return 0
+    over = maxDistance + 1
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > maxDistance:
+        return over
+    # a shared start or end costs nothing
+    start = 0
+    while start < len(a) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    if not a:
+        return len(b) if len(b) <= maxDistance else over
+    previous = None
+    row = [j if j <= maxDistance else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= maxDistance:
+            current[0] = i
+        best = current[0]
+        c = a[i - 1]
+        for j in range(max(1, i - maxDistance), min(len(b), i + maxDistance) + 1):
+            cost = row[j - 1] + (c != b[j - 1])
+            if row[j] + 1 < cost:
+                cost = row[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if i > 1 and j > 1 and c == b[j - 2] and a[i - 2] == b[j - 1] and previous[j - 2] + 1 < cost:
+                cost = previous[j - 2] + 1
+            if cost < over:
+                current[j] = cost
+                if cost < best:
+                    best = cost
+        if best >= over:
+            return over
+        previous, row = row, current
+    return row[-1]
+
+
+def allowedTypos(translation):
+    return len(foldAnswer(translation)) // charsPerTypo
+
+
+# Typos in a typed answer, or allowedTypos(translation) + 1 if there are
+# more than that.
+def countTypos(answer, translation):
+    return boundedDistance(foldAnswer(answer), foldAnswer(translation), allowedTypos(translation))
+
+
+def isCloseEnough(answer, translation):
+    return countTypos(answer, translation) <= allowedTypos(translation)
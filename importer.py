@@ -0,0 +1,125 @@
+import re
+import csv
+import sys
+import html
+import time
+from storage import newEntry
+
+batchSize = 10000
+progressEvery = 100000
+htmlTagPattern = re.compile(r'<[^>]*>')
+ankiSeparators = {
+    'tab': '\t',
+    'comma': ',',
+    'semicolon': ';',
+    'pipe': '|',
+    'space': ' ',
+}
+
+
+def guessFormat(file):
+    if file.lower().endswith('.csv'):
+        return 'csv'
+    elif file.lower().endswith('.tsv'):
+        return 'tsv'
+    return 'anki'
+
+
+# Yields (word, translation, category) per row. category is None when the
+# file does not have one. Reads one line at a time.
+def readRows(f, fmt):
+    if fmt == 'anki':
+        yield from readAnkiRows(f)
+        return
+    reader = csv.reader(f, delimiter='\t' if fmt == 'tsv' else ',')
+    columns = {'word': 0, 'translation': 1, 'category': 2}
+    for lineNumber, row in enumerate(reader):
+        if lineNumber == 0:
+            header = [name.strip().lower() for name in row]
+            if 'word' in header and 'translation' in header:
+                columns = {name: header.index(name) for name in columns if name in header}
+                continue
+        if len(row) <= max(columns['word'], columns['translation']):
+            yield None
+            continue
+        category = None
+        if 'category' in columns and columns['category'] < len(row):
+            category = row[columns['category']]
+        yield row[columns['word']], row[columns['translation']], category
+
+
+# Anki "Notes in Plain Text" exports: '#key:value' header lines, then fields
+# separated by the declared separator (tab by default).
+def readAnkiRows(f):
+    separator = '\t'
+    stripHtml = True
+    metaColumns = {}
+    inHeader = True
+    for line in f:
+        if inHeader and line.startswith('#'):
+            key, _, value = line[1:].strip().partition(':')
+            if key == 'separator':
+                separator = ankiSeparators.get(value.lower(), value)
+            elif key == 'html':
+                stripHtml = value.lower() == 'true'
+            elif key.endswith(' column'):
+                metaColumns[key[:-len(' column')]] = int(value) - 1
+            continue
+        inHeader = False
+        row = next(csv.reader([line], delimiter=separator), [])
+        fields = [value for i, value in enumerate(row) if i not in metaColumns.values()]
+        if len(fields) < 2:
+            yield None
+            continue
+        word, translation = fields[0], fields[1]
+        if stripHtml:
+            word = html.unescape(htmlTagPattern.sub('', word))
+            translation = html.unescape(htmlTagPattern.sub('', translation))
+        category = None
+        if 'deck' in metaColumns and metaColumns['deck'] < len(row):
+            category = row[metaColumns['deck']].split('::')[-1]
+        yield word, translation, category
+
+
+# Adds every new word in file to the store in batches and writes the deck once
+# at the end. Words already in the deck are skipped, new categories are added
+# to settings['categories']. Returns the import counts.
+def importFile(file, store, settings, fmt=None, defaultCategory='imported', report=print):
+    vocab = store.vocab
+    categories = settings.setdefault('categories', [])
+    knownCategories = set(categories)
+    now = time.time()
+    counts = {'rows': 0, 'added': 0, 'duplicates': 0, 'invalid': 0}
+    batch = []
+    start = time.perf_counter()
+    with open(file, newline='', encoding='utf-8-sig') as f:
+        for row in readRows(f, fmt or guessFormat(file)):
+            counts['rows'] += 1
+            if counts['rows'] % progressEvery == 0:
+                print(f"{counts['rows']} rows...", file=sys.stderr)
+            if row is None or not row[0].strip() or not row[1].strip():
+                counts['invalid'] += 1
+                continue
+            word, translation, category = row
+            word = word.strip()
+            if word in vocab:
+                counts['duplicates'] += 1
+                continue
+            category = (category or defaultCategory).strip().lower() or defaultCategory
+            if category not in knownCategories:
+                knownCategories.add(category)
+                categories.append(category)
+            vocab[word] = newEntry(translation.strip(), category, now)
+            batch.append(word)
+            if len(batch) >= batchSize:
+                store.saveWords(batch)
+                counts['added'] += len(batch)
+                batch = []
+    store.saveWords(batch)
+    counts['added'] += len(batch)
+    store.flush()
+
+    elapsed = time.perf_counter() - start
+    report(f"Read {counts['rows']} rows in {elapsed:.2f}s ({counts['rows'] / max(elapsed, 1e-9):.0f} rows/s): "
+           f"{counts['added']} added, {counts['duplicates']} already in the deck, {counts['invalid']} invalid.")
+    return counts
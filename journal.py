@@ -0,0 +1,65 @@
+import os
+import json
+from records import recordToJson
+
+
+# Append-only log of per-word changes. Each line holds the full entry for one
+# word, or null when the word was deleted. Replaying the log over the last
+# vocab.json snapshot gives back the current deck.
+class Journal:
+    def __init__(self, file, syncEvery=16):
+        self.file = file
+        self.syncEvery = syncEvery
+        self.unsynced = 0
+        self.f = open(file, 'a', encoding='utf-8')
+
+    def size(self):
+        return self.f.tell()
+
+    def record(self, word, entry):
+        self.f.write(json.dumps({'key': word, 'entry': entry}, default=recordToJson) + '\n')
+        self.f.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.syncEvery:
+            self.sync()
+
+    def sync(self):
+        if self.unsynced:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.unsynced = 0
+
+    # Applies every logged change to vocab and returns how many were replayed.
+    # A torn last line from a crash mid-write is cut off, so the next change
+    # is not appended onto it.
+    def replay(self, vocab):
+        count = 0
+        size = 0
+        with open(self.file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break
+                if change['entry'] is None:
+                    vocab.pop(change['key'], None)
+                else:
+                    vocab[change['key']] = change['entry']
+                size += len(line)
+                count += 1
+        if self.f.tell() != size:
+            self.f.truncate(size)
+        return count
+
+    # Empties the log once its changes are safely in the snapshot.
+    def reset(self):
+        self.f.truncate(0)
+        self.f.seek(0)
+        os.fsync(self.f.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        self.sync()
+        self.f.close()
@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import atexit
+import bisect
+import cProfile
+import pstats
+import functools
+import threading
+
+# Counters and timing histograms for the practice hot path: planning a round,
+# building questions, drawing the screen, saving answers and how long the
+# user took to answer. Off unless BRAINBURNER_PROFILE is set or a front end
+# is started with --profile; while off every call returns right away, so the
+# hooks can stay in the hot path. Once on, the collected numbers, and
+# cProfile's per-function timings of the main thread, are printed to stderr
+# on exit.
+enabled = False
+profiler = None
+counters = {}
+histograms = {}
+lock = threading.Lock()
+
+# Histogram bucket upper bounds: 1 microsecond doubling up to about 18 minutes.
+bucketBounds = [1e-6 * 2 ** i for i in range(31)]
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(bucketBounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(bucketBounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Upper bound of the bucket holding the given fraction of the values.
+    def percentile(self, fraction):
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= fraction * self.count:
+                return min(bucketBounds[i], self.max) if i < len(bucketBounds) else self.max
+        return self.max
+
+
+def count(name, amount=1):
+    if not enabled:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def observe(name, seconds):
+    if not enabled:
+        return
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(seconds)
+
+
+class Phase:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started)
+
+
+class NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+nullPhase = NullPhase()
+
+
+# with metrics.phase('plan round'): ... times the block into that histogram.
+def phase(name):
+    if not enabled:
+        return nullPhase
+    return Phase(name)
+
+
+# @metrics.timed('plan round') times every call of the function.
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Turns collection on, with cProfile of the calling thread when profile is
+# set, and prints everything to stderr at exit.
+def enable(profile=True):
+    global enabled, profiler
+    if enabled:
+        return
+    enabled = True
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    atexit.register(dump)
+
+
+def reset():
+    with lock:
+        counters.clear()
+        histograms.clear()
+
+
+def dump(file=None, limit=25):
+    file = file or sys.stderr
+    if profiler is not None:
+        profiler.disable()
+    with lock:
+        if counters:
+            print(f"{'counter':<30} {'value':>10}", file=file)
+            for name in sorted(counters):
+                print(f"{name:<30} {counters[name]:>10}", file=file)
+        if histograms:
+            print(f"{'timing (ms)':<30} {'count':>8} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}",
+                  file=file)
+            for name in sorted(histograms):
+                h = histograms[name]
+                print(f"{name:<30} {h.count:>8} {h.total / h.count * 1000:>9.3f} {h.percentile(0.5) * 1000:>9.3f} "
+                      f"{h.percentile(0.9) * 1000:>9.3f} {h.percentile(0.99) * 1000:>9.3f} {h.max * 1000:>9.3f}",
+                      file=file)
+    if profiler is not None:
+        pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(limit)
+
+
+if os.environ.get('BRAINBURNER_PROFILE', '') not in ('', '0'):
+    enable()
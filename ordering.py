@@ -0,0 +1,148 @@
+import bisect
+from scoring import AdjustedScores, scoreBucket
+
+# Sort keys pack (score, seq) into one int: score * seqRange + seq.
+seqRange = 1 << 40
+
+
+# Words kept sorted by key in two parallel lists, so the word order can be
+# copied out without touching the keys.
+class SortedWords:
+    def __init__(self, keys=(), words=()):
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.words = [words[i] for i in order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def insert(self, key, word):
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.words.insert(i, word)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        del self.keys[i]
+        del self.words[i]
+
+    def index(self, key):
+        return bisect.bisect_left(self.keys, key)
+
+
+# The word list order (see engine.sortVocab) kept up to date one word at a
+# time. Each category holds two sorted partitions, the one listed first and
+# the one listed second: non-favorites then favorites, or favorites then
+# non-favorites when reversed. Keys are (adjusted score, position in vocab)
+# with signs chosen to give the same order and tie breaks as sortVocab.
+# Scores are taken at the time the order was built; it must be rebuilt once
+# validUntil passes. Changing a word is a binary search and a list insert in
+# its category.
+class DeckOrder:
+    def __init__(self, vocab, adjusted, settings, now, validUntil, reverse=False):
+        self.settings = settings
+        self.now = now
+        self.validUntil = validUntil
+        self.reverse = reverse
+        # own copy of the row map, which the store's score columns keep changing
+        self.adjusted = AdjustedScores(dict(adjusted.rows), adjusted.scores, adjusted.buckets)
+        self.seq = {}
+        self.positions = {}
+        self.partitions = {}
+        self.version = 0
+        self.cachedLayout = None
+
+        # category -> [first keys, first words, second keys, second words]
+        unsorted = {}
+        for seq, word in enumerate(vocab):
+            self.seq[word] = seq
+            vWord = vocab[word]
+            first, key = self._key(adjusted.score(word), seq, vWord['isFavorite'])
+            self.positions[word] = (vWord['category'], first, key)
+            lists = unsorted.get(vWord['category'])
+            if lists is None:
+                lists = unsorted[vWord['category']] = [[], [], [], []]
+            lists[0 if first else 2].append(key)
+            lists[1 if first else 3].append(word)
+        self.nextSeq = len(self.seq)
+        for category, lists in unsorted.items():
+            self.partitions[category] = [SortedWords(lists[0], lists[1]), SortedWords(lists[2], lists[3])]
+
+    # (in first partition, sort key)
+    def _key(self, score, seq, isFavorite):
+        if not self.reverse:
+            return not isFavorite, score * seqRange + seq
+        if isFavorite:
+            return True, score * seqRange - seq
+        return False, seq - score * seqRange
+
+    # score is the word's adjusted score and nextChange when that next drops,
+    # which may end the order's validity early.
+    def update(self, word, vWord, score, nextChange):
+        self._unplace(word)
+        self.validUntil = min(self.validUntil, nextChange)
+        seq = self.seq.get(word)
+        if seq is None:
+            seq = self.seq[word] = self.nextSeq
+            self.nextSeq += 1
+        self.adjusted.set(word, score, scoreBucket(score, self.settings))
+        first, key = self._key(score, seq, vWord['isFavorite'])
+        self.positions[word] = (vWord['category'], first, key)
+        if vWord['category'] not in self.partitions:
+            self.partitions[vWord['category']] = [SortedWords(), SortedWords()]
+        self.partitions[vWord['category']][0 if first else 1].insert(key, word)
+        self.version += 1
+
+    def remove(self, word):
+        self._unplace(word)
+        self.seq.pop(word, None)
+        self.version += 1
+
+    def _unplace(self, word):
+        position = self.positions.pop(word, None)
+        if position is None:
+            return
+        category, first, key = position
+        partition = self.partitions[category]
+        partition[0 if first else 1].remove(key)
+        if not partition[0] and not partition[1]:
+            del self.partitions[category]
+
+    # Line of word in layout, as returned by layout(), or -1.
+    def index(self, word, layout):
+        position = self.positions.get(word)
+        if position is None:
+            return -1
+        category, first, key = position
+        firstWords, secondWords = self.partitions[category]
+        offset = firstWords.index(key) if first else len(firstWords) + secondWords.index(key)
+        return layout['groupStarts'][layout['categories'].index(category)] + offset
+
+    # Same shape as engine.buildWordListLayout. Categories are listed in the
+    # order their first word appears in the whole sorted deck.
+    def layout(self, version):
+        if self.cachedLayout is not None and self.cachedLayout['orderVersion'] == self.version:
+            self.cachedLayout['version'] = version
+            return self.cachedLayout
+
+        def firstKey(category):
+            first, second = self.partitions[category]
+            return (0, first.keys[0]) if first else (1, second.keys[0])
+        categories = sorted(self.partitions, key=firstKey)
+        words = []
+        groupStarts = []
+        for category in categories:
+            first, second = self.partitions[category]
+            groupStarts.append(len(words))
+            words += first.words
+            words += second.words
+        self.cachedLayout = {
+            'version': version,
+            'orderVersion': self.version,
+            'validUntil': self.validUntil,
+            'adjusted': self.adjusted,
+            'words': words,
+            'groupStarts': groupStarts,
+            'categories': categories,
+        }
+        return self.cachedLayout
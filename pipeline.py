@@ -0,0 +1,36 @@
+import threading
+import concurrent.futures
+import metrics
+
+
+# Saves the answered words of a practice round on one worker thread, so the
+# journal write (and its fsync) overlaps with the user reading the next
+# question, which engine.planRound already built with the rest of the round.
+# One worker keeps the saves in the order they were made. Anything that
+# changes a word on the calling thread must hold lock, which the worker holds
+# for every save.
+class RoundPipeline:
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.saves = []
+
+    # Saves the word and logs the review given as (game, isGoodAnswer,
+    # latency, now, confusedWith) on the worker.
+    def save(self, word, review=None):
+        self.saves.append(self.executor.submit(self._save, word, review))
+        self.saves = [future for future in self.saves if not future.done() or future.exception()]
+
+    # Waits for every save; the first one that failed raises here.
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for future in self.saves:
+            future.result()
+        self.saves = []
+
+    def _save(self, word, review):
+        with self.lock, metrics.phase('save word'):
+            self.store.saveWord(word, self.store.vocab[word])
+            if review is not None:
+                self.store.logReview(word, *review)
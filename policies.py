@@ -0,0 +1,149 @@
+import math
+from scheduler import getDueTime, practiceCooldown
+
+daySeconds = 3600 * 24
+
+
+# Scheduling policies decide when a word is due again. Every store asks its
+# policy for due times (store.policy.dueTime) and the answer path tells it how
+# each review went (store.policy.review). Policies that keep their own state
+# store it on the word as vWord['schedule'], a dict tagged with the policy
+# name; a word without state for the current policy falls back to the decay
+# due time until its next review.
+def getPolicy(settings):
+    name = settings.get('schedulingPolicy', 'decay')
+    if name not in policyTypes:
+        raise ValueError(f"Unknown scheduling policy '{name}'.")
+    return policyTypes[name](settings)
+
+
+# The original model: scores drop one point per two hours, slower for long
+# streaks, and a word is due once its score is below maxScore (see
+# scheduler.getDueTime). Keeps no state of its own.
+class DecayPolicy:
+    name = 'decay'
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def state(self, vWord):
+        schedule = vWord.get('schedule')
+        if schedule is not None and schedule.get('policy') == self.name:
+            return schedule
+        return None
+
+    def dueTime(self, vWord):
+        state = self.state(vWord)
+        if state is None:
+            return getDueTime(vWord, self.settings)
+        return state['due']
+
+    def review(self, vWord, isGoodAnswer, now):
+        pass
+
+
+# SM-2 (SuperMemo 2): intervals of 1 day, 6 days, then the last interval
+# times the word's ease factor. A right answer is graded 4, a wrong one 1,
+# which resets the repetitions and lowers the ease. Answers given before the
+# word is due (the same word comes up several times in a round) do not
+# lengthen the interval, and a word that already lapsed is not lowered again
+# until it has been relearned.
+class Sm2Policy(DecayPolicy):
+    name = 'sm2'
+    initialEase = 2.5
+    minEase = 1.3
+
+    def review(self, vWord, isGoodAnswer, now):
+        state = self.state(vWord)
+        if state is None:
+            state = {'policy': self.name, 'due': now, 'last': now,
+                     'ease': self.initialEase, 'interval': 0, 'reps': 0, 'lapses': 0}
+        elif now < state['due'] and (isGoodAnswer or state['reps'] == 0):
+            state = dict(state, last=now)
+            vWord['schedule'] = state
+            return
+        else:
+            state = dict(state)
+
+        quality = 4 if isGoodAnswer else 1
+        state['ease'] = max(self.minEase, state['ease'] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        if isGoodAnswer:
+            state['reps'] += 1
+            if state['reps'] == 1:
+                state['interval'] = 1
+            elif state['reps'] == 2:
+                state['interval'] = 6
+            else:
+                state['interval'] = round(state['interval'] * state['ease'])
+            state['due'] = now + state['interval'] * daySeconds
+        else:
+            state['reps'] = 0
+            state['interval'] = 0
+            state['lapses'] += 1
+            # relearned this session, after the usual cooldown
+            state['due'] = now + practiceCooldown
+        state['last'] = now
+        vWord['schedule'] = state
+
+
+# FSRS 4.5 (Free Spaced Repetition Scheduler) with its published default
+# weights: each word has a stability (days until recall drops to 90%) and a
+# difficulty (1 to 10). A review updates both from the recall probability at
+# the time of the review, and the next one is scheduled for when recall is
+# expected to fall to requestRetention. Right answers are graded Good and
+# wrong ones Again. settings may override fsrsWeights and requestRetention.
+class FsrsPolicy(DecayPolicy):
+    name = 'fsrs'
+    defaultWeights = [0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+                      0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755]
+    decay = -0.5
+    factor = 19 / 81
+    maxInterval = 36500
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.weights = settings.get('fsrsWeights', FsrsPolicy.defaultWeights)
+        self.requestRetention = settings.get('requestRetention', 0.9)
+
+    def retrievability(self, elapsedDays, stability):
+        return (1 + self.factor * elapsedDays / stability) ** self.decay
+
+    def nextInterval(self, stability):
+        days = stability / self.factor * (self.requestRetention ** (1 / self.decay) - 1)
+        return min(max(1, round(days)), self.maxInterval)
+
+    def review(self, vWord, isGoodAnswer, now):
+        w = self.weights
+        grade = 3 if isGoodAnswer else 1
+        state = self.state(vWord)
+        if state is None:
+            state = {'policy': self.name, 'stability': w[grade - 1],
+                     'difficulty': self._initialDifficulty(grade), 'reps': 0, 'lapses': 0}
+        else:
+            state = dict(state)
+            stability = state['stability']
+            difficulty = state['difficulty']
+            r = self.retrievability(max(0, now - state['last']) / daySeconds, stability)
+            nextDifficulty = difficulty - w[6] * (grade - 3)
+            state['difficulty'] = min(10, max(1, w[7] * self._initialDifficulty(4) + (1 - w[7]) * nextDifficulty))
+            if isGoodAnswer:
+                state['stability'] = stability * (1 + math.exp(w[8]) * (11 - difficulty) * stability ** -w[9] *
+                                                  (math.exp(w[10] * (1 - r)) - 1))
+            else:
+                state['stability'] = min(stability, w[11] * difficulty ** -w[12] *
+                                         ((stability + 1) ** w[13] - 1) * math.exp(w[14] * (1 - r)))
+        if isGoodAnswer:
+            state['reps'] += 1
+            state['due'] = now + self.nextInterval(state['stability']) * daySeconds
+        else:
+            state['lapses'] += 1
+            state['due'] = now + practiceCooldown
+        state['last'] = now
+        vWord['schedule'] = state
+
+    def _initialDifficulty(self, grade):
+        w = self.weights
+        return min(10, max(1, w[4] - (grade - 3) * w[5]))
+
+
+policyTypes = {policy.name: policy for policy in (DecayPolicy, Sm2Policy, FsrsPolicy)}
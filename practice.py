@@ -2,7 +2,17 @@ import os
 import sys
 import json
 import time
-import random
+import atexit
+import bisect
+import argparse
+from storage import loadJson, saveJson, openStore, importJson, exportJson, newEntry
+from importer import importFile
+from exporter import exportFile, deckStats, printStats
+import engine
+import metrics
+import grading
+from pipeline import RoundPipeline
+from screen import Screen, visibleLength
 formatting = {
     "reset": '\033[0m',
     "bold": '\033[01m',
@@ -44,108 +54,137 @@ formatting = {
         "lightGray": '\033[47m'
     }
 }
+screen = Screen()
+theme = {}
 
 
-def loadJson(file):
-    with open(file) as f:
-        data = json.load(f)
-    return data
+def loadVocab():
+    global vocab
+    global store
+    store = openStore(settings)
+    vocab = store.load()
+    atexit.register(store.close)
 
 
-def saveJson(data, file):
-    with open(file, 'w') as f:
-        json.dump(data, f, indent=4, sort_keys=True)
+def reindexVocab():
+    global store
+    store.reindex()
 
 
-def loadVocab():
-    global vocab
-    if not os.path.exists('vocab.json'):
-        print('Vocabulary not found. Creating new one...')
-        vocab = {}
-        saveJson(vocab, 'vocab.json')
-    else:
-        vocab = loadJson('vocab.json')
-    saveVocab()
+# Call after changing a word in vocab so the store can persist it and keep its
+# indexes current.
+@metrics.timed('save word')
+def touchWord(word):
+    store.saveWord(word, vocab[word])
+
+
+def dropWord(word):
+    store.deleteWord(word)
 
 
 def saveVocab():
     global vocab
-    saveJson(vocab, 'vocab.json')
+    store.saveAll(vocab)
+
+
+settingVersion = 4
+defaultSettings = {
+    "settingVersion": settingVersion,
+    "screenWidth": 65,
+    "numPracticeWords": 8,
+    "maxScore": 15,
+    "maxStreak": 35,
+    "practiceMode": "random",
+    "bgColor": "black",
+    "fgColor": "white",
+    "highlightColorFG": "blue",
+    "highlightColorBG": "lightGray",
+    "borderColor": "blue",
+    "seperatorColor": "darkBlue",
+    "showScore": True,
+    "showTranslations": True,
+    "fastStart": False,
+    "schedulingPolicy": "decay",
+}
 
 
 def loadSettings():
     global settings
-    settingVersion = 3
     if not os.path.exists('settings.json'):
         print('Settings not found. Creating new one...')
-        settings = {
-            "settingVersion": settingVersion,
-            "screenWidth": 65,
-            "numPracticeWords": 8,
-            "maxScore": 15,
-            "maxStreak": 35,
-            "practiceMode": "random",
-            "bgColor": "black",
-            "fgColor": "white",
-            "highlightColorFG": "blue",
-            "highlightColorBG": "lightGray",
-            "borderColor": "blue",
-            "seperatorColor": "darkBlue",
-            "showScore": True,
-            "showTranslations": True,
-        }
+        settings = dict(defaultSettings)
         # saveSettings()
     else:
         settings = loadJson('settings.json')
-        if 'settingVersion' not in settings or settings['settingVersion'] != settingVersion:
-            os.remove('settings.json')
-            loadSettings()
+        if settings.get('settingVersion') != settingVersion:
+            migrateSettings()
+    applyTheme()
+
+
+# Settings from another version keep their values; missing ones get the
+# defaults and the file is updated in place.
+def migrateSettings():
+    global settings
+    for key in defaultSettings:
+        settings.setdefault(key, defaultSettings[key])
+    settings['settingVersion'] = settingVersion
+    saveJson(settings, 'settings.json')
 
 
 def saveSettings():
     global settings
     saveJson(settings, 'settings.json')
+    applyTheme()
+
+
+# Precomputes the colored pieces every line is built from, so drawing a line
+# is a few string joins. Must run again whenever colors or width change.
+def applyTheme():
+    global theme
+    width = settings["screenWidth"]
+    border = formatting['fg'][settings['borderColor']] + formatting['bg'][settings['bgColor']]
+    text = formatting['fg'][settings['fgColor']] + formatting['bg'][settings['bgColor']]
+    theme = {
+        "border": border + "#" * width + formatting['reset'],
+        "lineSeperator": border + "|" + formatting['fg'][settings['seperatorColor']] + formatting['bg'][settings['bgColor']] + '-' * (width - 2) + formatting['fg'][settings['borderColor']] + "|" + formatting['reset'],
+        "spaceSeperator": border + "|" + ' ' * (width - 2) + "|" + formatting['reset'],
+        "text": text,
+        "centeredStart": border + "|" + text,
+        "centeredMiddle": formatting['reset'] + formatting['bg'][settings['bgColor']],
+        "centeredEnd": border + "|" + formatting['reset'],
+        "colStart": border + "| " + text,
+        "colEnd": formatting['reset'] + border + " |" + formatting['reset'],
+    }
 
 
 def clearScreen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    screen.clear()
+
+
+# Shows the pending frame, then reads a line of input.
+def prompt(text=''):
+    with metrics.phase('draw screen'):
+        screen.flush()
+    answer = input(text)
+    screen.inputDone()
+    return answer
 
 
 def printBorder():
-    global settings
-    text = "#" * settings["screenWidth"]
-    text = formatting['fg'][settings['borderColor']] + \
-        formatting['bg'][settings['bgColor']] + text + formatting['reset']
-    print(text)
+    screen.write(theme["border"])
 
 
 def printLineSeperator():
-    global settings
-    text = '-' * (settings["screenWidth"] - 2)
-    text = formatting['fg'][settings['borderColor']] + formatting['bg'][settings['bgColor']] + "|" + formatting['fg'][settings['seperatorColor']
-                                                                                                                      ] + formatting['bg'][settings['bgColor']] + text + formatting['fg'][settings['borderColor']] + "|" + formatting['reset']
-    print(text)
+    screen.write(theme["lineSeperator"])
 
 
 def printSpaceSeperator():
-    global settings
-    text = ' ' * (settings["screenWidth"] - 2)
-    text = formatting['fg'][settings['borderColor']] + \
-        formatting['bg'][settings['bgColor']] + \
-        "|" + text + "|" + formatting['reset']
-    print(text)
+    screen.write(theme["spaceSeperator"])
 
 
 # Removes formmating strings and returns length
 def measureTextLength(text):
-    textCopy = text[:]
-    for key in formatting:
-        if type(formatting[key]) == str:
-            textCopy = textCopy.replace(formatting[key], '')
-        elif type(formatting[key]) == dict:
-            for k in formatting[key]:
-                textCopy = textCopy.replace(formatting[key][k], '')
-    return len(textCopy)
+    return visibleLength(text)
 
 
 def printCentered(text, spaceChar=' '):
@@ -153,13 +192,10 @@ def printCentered(text, spaceChar=' '):
     length = measureTextLength(text)
     spaceCount = int((settings["screenWidth"] - length - 2) / 2)
     spacing = spaceChar * spaceCount
-    text = formatting['fg'][settings['borderColor']] + formatting['bg'][settings['bgColor']] + "|" + formatting['fg'][settings['fgColor']] + formatting['bg'][settings['bgColor']
-                                                                                                                                                              ] + spacing + text + formatting['reset'] + formatting["bg"][settings["bgColor"]] + spacing
-    if measureTextLength(text) != settings["screenWidth"] - 1:
+    text = theme["centeredStart"] + spacing + text + theme["centeredMiddle"] + spacing
+    if length + spaceCount * 2 + 1 != settings["screenWidth"] - 1:
         text += spaceChar
-    text = text + formatting['fg'][settings['borderColor']] + \
-        formatting['bg'][settings['bgColor']] + "|" + formatting['reset']
-    print(text)
+    screen.write(text + theme["centeredEnd"])
 
 
 def printCol_2(col1, col2):
@@ -167,9 +203,7 @@ def printCol_2(col1, col2):
     length = measureTextLength(col1) + measureTextLength(col2)
     spaceCount = (settings["screenWidth"] - length - 4)
     spacing = " " * spaceCount
-    text = formatting['fg'][settings['borderColor']] + formatting['bg'][settings['bgColor']] + "| " + formatting['fg'][settings['fgColor']] + formatting['bg'][settings['bgColor']] + col1 + formatting['fg'][settings['fgColor']] + formatting['bg'][settings['bgColor']
-                                                                                                                                                                                                                                                      ] + spacing + formatting['fg'][settings['fgColor']] + formatting['bg'][settings['bgColor']] + col2 + formatting['reset'] + formatting['fg'][settings['borderColor']] + formatting['bg'][settings['bgColor']] + " |" + formatting['reset']
-    print(text)
+    screen.write(theme["colStart"] + col1 + theme["text"] + spacing + theme["text"] + col2 + theme["colEnd"])
 
 
 def printLeft(text):
@@ -180,74 +214,82 @@ def printRight(text):
     printCol_2("", text)
 
 
-def printWordList(showTranslations=True, selectLine=-1, reverse=False):
+# Words in list order, grouped by category. Rebuilt only when the deck changes
+# or a score decays, so moving around the list does not re-sort the deck.
+def getWordListLayout(reverse=False):
+    return engine.getWordListLayout(store, time.time(), reverse)
+
+
+def getWordLine(word):
+    return engine.getWordLine(store, word, time.time())
+
+
+# First and last+1 line of the page holding selectLine. A pageSize of 0 shows
+# the whole list.
+def getPage(selectLine, count):
+    pageSize = settings.get('pageSize', 20)
+    if pageSize <= 0:
+        return 0, count
+    start = max(selectLine, 0) // pageSize * pageSize
+    return start, min(start + pageSize, count)
+
+
+# The whole list, or with paged only the page holding selectLine (see
+# getPage), for views that can move between pages.
+@metrics.timed('word list')
+def printWordList(showTranslations=True, selectLine=-1, reverse=False, paged=False):
     global vocab
     global settings
     printBorder()
-    sW = sortVocab(reverse)
-    wordsByCategory = {}
-    for word in sW:
-        category = vocab[word]['category']
-        if category not in wordsByCategory:
-            wordsByCategory[category] = []
-        wordsByCategory[category].append(word)
+    layout = getWordListLayout(reverse)
+    adjusted = layout['adjusted']
+    words = layout['words']
+    groupStarts = layout['groupStarts']
+    start, end = getPage(selectLine, len(words)) if paged else (0, len(words))
 
     selectedWord = None
-    sortedWords = []
-    for category in wordsByCategory:
-        for word in wordsByCategory[category]:
-            sortedWords.append(word)
-
-    i = 0
-    for category in wordsByCategory:
-        formatString = f"{formatting['fg'][settings['fgColor']]}{formatting['bg'][settings['bgColor']]}{formatting['bold']}"
-        printCentered(formatString + "[  " + category.upper() + "  ]" + formatting['reset'], '-')
-        for word in wordsByCategory[category]:
-            bg = formatting['bg'][settings['bgColor']]
-            fg = formatting['fg'][settings['fgColor']]
-            color = getScoredColor(vocab[word]) + bg
-            if selectLine == i:
-                fg = formatting['fg'][settings['highlightColorFG']]
-                bg = formatting['bg'][settings['highlightColorBG']]
-                color = fg + bg
-                selectedWord = word
-
-            text = f"{color}{word}"
-            if showTranslations:
-                text = f"{text} = {vocab[word]['word']}"
+    for i in range(start, end):
+        if i == start or i in groupStarts:
+            category = layout['categories'][bisect.bisect_right(groupStarts, i) - 1]
+            formatString = f"{formatting['fg'][settings['fgColor']]}{formatting['bg'][settings['bgColor']]}{formatting['bold']}"
+            printCentered(formatString + "[  " + category.upper() + "  ]" + formatting['reset'], '-')
+        word = words[i]
+        bg = formatting['bg'][settings['bgColor']]
+        fg = formatting['fg'][settings['fgColor']]
+        color = formatting['fg'][adjusted.color(word)] + bg
+        if selectLine == i:
+            fg = formatting['fg'][settings['highlightColorFG']]
+            bg = formatting['bg'][settings['highlightColorBG']]
+            color = fg + bg
+            selectedWord = word
+
+        text = f"{color}{word}"
+        if showTranslations:
+            text = f"{text} = {vocab[word]['word']}"
+
+        if settings['showScore']:
+            text = f"{text}{formatting['reset']}{fg}{bg} ({adjusted.score(word)})"
+
+        if vocab[word]['isFavorite']:
+            text = f"{formatting['fg']['yellow']}{bg}★ {text} {formatting['fg']['yellow']}{bg}★"
+
+        printCentered(text)
+    if end - start < len(words):
+        printCentered(f"{start + 1}-{end} of {len(words)} (7/8 for the previous/next page)")
+    return selectedWord
 
-            if settings['showScore']:
-                adjustedScore = adjustScoreBasedOnTime(vocab[word])
-                text = f"{text}{formatting['reset']}{fg}{bg} ({adjustedScore})"
 
-            if vocab[word]['isFavorite']:
-                text = f"{formatting['fg']['yellow']}{bg}★ {text} {formatting['fg']['yellow']}{bg}★"
+# Reference implementation for a single word. Whole-deck renders use
+# store.adjustScores, which must give the same results.
+def adjustScoreBasedOnTime(vWord, now=None):
+    global settings
+    return engine.adjustScoreBasedOnTime(vWord, settings, now)
 
-            printCentered(text)
-            i += 1
-    return selectedWord
 
-def adjustScoreBasedOnTime(vWord):
-    global settings
-    scoreDepletionRate = 1
-    if vWord['streak'] > 0:
-        if vWord['streak'] >= settings['maxStreak']:
-            return vWord['score']
-        scoreDepletionRate = vWord['streak'] / settings['maxStreak']
-        scoreDepletionRate = 1 - scoreDepletionRate
-
-    nScore = vWord['score'] - \
-        int((((time.time() - vWord['lastPracticed']) /
-            3600) / 2) * scoreDepletionRate)
-    if nScore < 0:
-        nScore = 0
-    return nScore
-
-
-def getScoredColor(vocabWord):
+def getScoredColor(vocabWord, now=None):
     global settings
     color = formatting['fg']['blue']
-    adjustedScore = adjustScoreBasedOnTime(vocabWord)
+    adjustedScore = adjustScoreBasedOnTime(vocabWord, now)
     sectionLength = int(settings["maxScore"] / 4)
     if adjustedScore < 1:
         color = formatting['fg']['gray']
@@ -262,55 +304,21 @@ def getScoredColor(vocabWord):
     return color
 
 
-def sortVocab(reverse=False):
+def sortVocab(reverse=False, adjusted=None):
     global vocab
-    sortedV = sorted(vocab, key=lambda k: adjustScoreBasedOnTime(
-        vocab[k]), reverse=reverse)
-    removedFavorites = []
-    for i in range(len(sortedV)):
-        if vocab[sortedV[i]]['isFavorite']:
-            removedFavorites.append(sortedV[i])
-    for i in range(len(removedFavorites)):
-        sortedV.remove(removedFavorites[i])
-
-    if reverse:
-        sortedV.reverse()
-        sortedV.extend(removedFavorites)
-        sortedV.reverse()
-    else:
-        sortedV.extend(removedFavorites)
-
-    return sortedV
-
-
-def shuffleList(l):
-    for i in range(len(l)):
-        r = random.randint(0, len(l) - 1)
-        l[i], l[r] = l[r], l[i]
-    return l
+    if adjusted is None:
+        adjusted = store.adjustScores(time.time())
+    return engine.sortVocab(vocab, adjusted, reverse)
 
 
 def getPracticeWords(num):
-    global vocab
-    global settings
-    sortedVocab = sortVocab(reverse=True)
-    wordsToPractice = []
-    i = 0
-    while len(wordsToPractice) < num and i < len(sortedVocab):
-        word = sortedVocab[i]
-        adjustedScore = adjustScoreBasedOnTime(vocab[word])
-        if adjustedScore < settings["maxScore"] and time.time() - vocab[word]['lastPracticed'] > 60 * 5: # 5 minutes
-            wordsToPractice.append(word)
-        i += 1
-    ammountLeft = num - len(wordsToPractice)
-    if ammountLeft:
-        wordsToPractice.extend(sortedVocab[-ammountLeft:])
-    return wordsToPractice
+    global store
+    return store.practiceWords(num, time.time())
 
 def getCategory():
     global settings
     while True:
-        newCategory = input(f'Category: ').lower()
+        newCategory = prompt(f'Category: ').lower()
         if newCategory == '0':
             return '0'
         elif newCategory == '':
@@ -318,7 +326,7 @@ def getCategory():
         if newCategory not in settings['categories']:
             printCentered(f"Category '{newCategory}' not found.")
             printCentered("Would you like to add it? (y/n)")
-            choice = input(': ').lower()
+            choice = prompt(': ').lower()
             if choice == 'y':
                 settings['categories'].append(newCategory)
                 saveSettings()
@@ -336,34 +344,28 @@ def addWords():
         printLineSeperator()
         printCentered("0. Exit.")
         printBorder()
-        word = input(': ')
+        word = prompt(': ')
         if word == '0':
             return
         else:
-            tWord = input(f'{word} = ')
+            tWord = prompt(f'{word} = ')
             if tWord == '0':
                 continue
             newCategory = getCategory()
             if newCategory == '0':
                 continue
-            vocab[word] = {
-                'word': tWord,
-                'streak': 0,
-                'lastPracticed': time.time(),
-                'score': 0,
-                'isFavorite': False,
-                'category': newCategory
-            }
-            saveVocab()
+            vocab[word] = newEntry(tWord, newCategory)
+            touchWord(word)
 
 
 def editWords():
     global vocab
-    vocabKeys = list(vocab.keys())
     selectLine = 0
+    matches = []
+    match = 0
     while True:
         clearScreen()
-        selectedWord = printWordList(selectLine=selectLine)
+        selectedWord = printWordList(selectLine=selectLine, paged=True)
         printLineSeperator()
         printCentered("Edit word list.")
         printLineSeperator()
@@ -371,11 +373,13 @@ def editWords():
         printSpaceSeperator()
         printCol_2("1. Add words", "2. Remove word")
         printCol_2("3. Edit word", "4. Edit translation")
-        printCol_2("5. Toggle Favorite", "")
+        printCol_2("5. Toggle Favorite", "6. Next category")
+        printCol_2("7. Previous page", "8. Next page")
+        printCol_2("9. Search", "")
         printSpaceSeperator()
         printCentered("0. Exit")
         printBorder()
-        opt = input(': ')
+        opt = prompt(': ')
         if opt == '0':
             return
         elif opt == '1':
@@ -383,10 +387,10 @@ def editWords():
             selectLine = 0
         elif opt == '2':
             del vocab[selectedWord]
-            saveVocab()
+            dropWord(selectedWord)
             selectLine -= 1
         elif opt == '3':
-            newWord = input(f'{selectedWord} > ')
+            newWord = prompt(f'{selectedWord} > ')
             if newWord == '0':
                 continue
             elif newWord == "":
@@ -395,46 +399,63 @@ def editWords():
             if newWord != selectedWord:
                 vocab[newWord] = vocab[selectedWord]
                 del vocab[selectedWord]
+                dropWord(selectedWord)
             vocab[newWord]['category'] = newCategory
-            saveVocab()
+            touchWord(newWord)
         elif opt == '4':
-            newTranslation = input(f'{selectedWord} = ')
+            newTranslation = prompt(f'{selectedWord} = ')
             if newTranslation == '0':
                 continue
             vocab[selectedWord]['word'] = newTranslation
-            saveVocab()
+            touchWord(selectedWord)
         elif opt == '5':
             vocab[selectedWord]['isFavorite'] = not vocab[selectedWord]['isFavorite']
+            touchWord(selectedWord)
             selectLine += 1
-            saveVocab()
+        elif opt == '6':
+            groupStarts = getWordListLayout()['groupStarts']
+            group = bisect.bisect_right(groupStarts, selectLine)
+            selectLine = groupStarts[group] if group < len(groupStarts) else 0
+        elif opt == '7':
+            selectLine -= max(settings.get('pageSize', 20), 1)
+            if selectLine < 0:
+                selectLine = max(len(vocab) - 1, 0)
+        elif opt == '8':
+            selectLine += max(settings.get('pageSize', 20), 1)
+        elif opt == '9':
+            # an empty search moves on to the next match of the last one
+            text = prompt('Search: ')
+            if text == '0':
+                continue
+            elif text != '':
+                matches = store.searchWords(text)
+                match = 0
+            elif matches:
+                match = (match + 1) % len(matches)
+            if matches:
+                selectLine = getWordLine(matches[match])
         else:
             selectLine += 1
 
-        if selectLine < 0 or selectLine > len(vocabKeys) - 1:
+        if selectLine < 0 or selectLine > len(vocab) - 1:
             selectLine = 0
 
 
 def practice(practiceAll=False):
     global vocab
     global settings
-    tWords = [vocab[word]["word"] for word in vocab]
     while True:
-        if practiceAll:
-            wordsToPractice = getPracticeWords(len(vocab))
-        else:
-            wordsToPractice = getPracticeWords(settings["numPracticeWords"])
-            wordsToPractice = [
-                val for val in wordsToPractice for _ in range(3)]
-            wordsToPractice = shuffleList(wordsToPractice)
-        wordCount = len(wordsToPractice)
+        questions = engine.planRound(store, practiceAll)
+        wordCount = len(questions)
+        pipeline = RoundPipeline(store)
         i = 0
         correct = 0
         wrong = 0
-        for word in wordsToPractice:
+        for question in questions:
             i += 1
-            vWord = vocab[word]
-            vWord["score"] = adjustScoreBasedOnTime(vWord)
-            vWord['lastPracticed'] = time.time()
+            word = question['word']
+            with pipeline.lock:
+                vWord = engine.startQuestion(store, word)
             cw = (correct + wrong)
             if cw:
                 accuracy = int((correct / cw) * 100)
@@ -442,11 +463,7 @@ def practice(practiceAll=False):
                 accuracy = 'N/A'
             clearScreen()
             printBorder()
-            if settings["practiceMode"] == "random":
-                game = random.choice(
-                    ["multiple choice", "multiple choice", "true/false"])  # Bigger chance for multiple choice
-            else:
-                game = settings["practiceMode"]
+            game = question['game']
 
             if game == "multiple choice":
                 printCentered(f"Multiple Choice - {i}/{wordCount}")
@@ -456,6 +473,10 @@ def practice(practiceAll=False):
                 printCentered(f"True/False - {i}/{wordCount}")
                 printCentered(
                     f"C:{correct} W:{wrong} Acc:{accuracy}%")
+            elif game == "typed":
+                printCentered(f"Typed - {i}/{wordCount}")
+                printCentered(
+                    f"C:{correct} W:{wrong} Acc:{accuracy}%")
 
             printLineSeperator()
             printCentered("Press enter if you remember.")
@@ -480,78 +501,66 @@ def practice(practiceAll=False):
             printBorder()
 
             # Wait for input if the word is not new, so we don't give hints.
-            waitIn = input()
+            askedAt = time.time()
+            waitIn = prompt()
             canRemember = True
             isGoodAnswer = False
+            confusedWith = None
             if waitIn == '0':
+                pipeline.close()
                 return
             elif waitIn == '1':
                 canRemember = False
             printBorder()
             if canRemember:
-                tf_correctChoice = "1"
-                categoryWords = [vocab[word]['word'] for word in vocab if vocab[word]['category'] == vWord['category']]
-                categoryWords.remove(vWord['word'])
-                nonCategoryWords = [vocab[word]['word'] for word in vocab if vocab[word]['category'] != vWord['category']]
                 if game == "multiple choice":
-                    # old algo
-                    # answers = [vWord['word']]
-                    # answers.extend(random.sample(tWords, 3))
-                    # answers = shuffleList(answers)
-
-                    # give 4 answers, removing the current one to prevent duplicates, start with the current one, add matching category words shuffled and if not enough add random words
-                    answers = [vWord['word']]
-                    answers = set(answers)
-                    answers.update(random.sample(categoryWords, min(3, len(categoryWords)))) # add category words if there are any
-                    if len(answers) < 4:
-                        answers.update(random.sample(nonCategoryWords, 4 - len(answers))) # add random words if not enough
-                    answers = shuffleList(list(answers))
+                    answers = question['answers']
                     for aI in range(len(answers)):
                         printCentered(
                             f"{formatting['bold']}{aI + 1}. {answers[aI]}")
                 elif game == "true/false":
-                    tf_correctChoice = random.choice(["1", "2"])
-                    text = ""
-                    if tf_correctChoice == "1":
-                        text = f"{word} = {vWord['word']}"
-                    else:
-                        wrongAnswer = random.choice(categoryWords)
-                        if not wrongAnswer:
-                            wrongAnswer = random.choice(nonCategoryWords)
-                        text = f"{word} = {wrongAnswer}"
                     printCentered(
-                        f"{formatting['bold']}{text}")
+                        f"{formatting['bold']}{word} = {question['shown']}")
+                elif game == "typed":
+                    printCentered(
+                        f"{formatting['bold']}Type the word for '{word}'.")
 
                 printBorder()
-                answer = input(': ')
+                answer = prompt(f'{word} = ' if game == "typed" else ': ')
                 if answer == '0':
+                    pipeline.close()
                     return
-                if game == "multiple choice":
-                    isGoodAnswer = answer and answers[int(
-                        answer) - 1] == vWord['word']
-                elif game == "true/false":
-                    isGoodAnswer = answer == tf_correctChoice
-                    if isGoodAnswer and tf_correctChoice == "2":
+                isGoodAnswer = engine.isCorrectAnswer(store, question, answer)
+                confusedWith = engine.confusedWith(question, answer)
+                if game == "true/false":
+                    if isGoodAnswer and question['correctChoice'] == "2":
                         printBorder()
                         printCentered(f"{formatting['fg']['green']}Correct!")
                         printCentered(f"The real word for {formatting['fg']['white']}{formatting['bg'][settings['bgColor']]}{formatting['bold']}'{word}'{formatting['reset']}{formatting['fg'][settings['fgColor']]}{formatting['bg'][settings['bgColor']]} is {formatting['fg']['white']}{formatting['bg'][settings['bgColor']]}{formatting['bold']}'{vWord['word']}'{formatting['reset']}{formatting['fg'][settings['fgColor']]}{formatting['bg'][settings['bgColor']]}.")
                         printBorder()
-                        input()
+                        prompt()
+                elif game == "typed":
+                    if isGoodAnswer and grading.countTypos(answer, vWord['word']):
+                        printBorder()
+                        printCentered(f"{formatting['fg']['green']}Close enough!")
+                        printCentered(f"The word for {formatting['fg']['white']}{formatting['bg'][settings['bgColor']]}{formatting['bold']}'{word}'{formatting['reset']}{formatting['fg'][settings['fgColor']]}{formatting['bg'][settings['bgColor']]} is spelled {formatting['fg']['white']}{formatting['bg'][settings['bgColor']]}{formatting['bold']}'{vWord['word']}'{formatting['reset']}{formatting['fg'][settings['fgColor']]}{formatting['bg'][settings['bgColor']]}.")
+                        printBorder()
+                        prompt()
 
+            answeredAt = time.time()
+            with pipeline.lock:
+                engine.gradeAnswer(vWord, isGoodAnswer, store.policy, answeredAt)
+            # saved while the next question is on screen
+            pipeline.save(word, (game, isGoodAnswer, answeredAt - askedAt, answeredAt, confusedWith))
             if isGoodAnswer:
-                vWord['streak'] += 1
-                vWord['score'] += 1
                 correct += 1
             else:
-                vWord['streak'] = 0
-                vWord['score'] *= 0.7
-                vWord['score'] = int(vWord['score'])
                 wrong += 1
                 printBorder()
                 printCentered(f"{formatting['fg']['red']}The word for {formatting['fg']['white']}{formatting['bold']}'{word}'{formatting['reset']}{formatting['fg']['red']}{formatting['bg'][settings['bgColor']]} is {formatting['fg']['white']}{formatting['bold']}'{vWord['word']}'{formatting['fg']['red']}.")
                 printBorder()
-                input()
-            saveVocab()
+                prompt()
+        pipeline.close()
         clearScreen()
         printBorder()
         printCentered(f"{formatting['fg']['green']}Practice Complete!")
@@ -566,7 +575,7 @@ def practice(practiceAll=False):
         printCentered("Press enter to practice again.")
         printCentered("Press 0 to exit.")
         printBorder()
-        opt = input()
+        opt = prompt()
         if opt == '0':
             return
 
@@ -603,7 +612,7 @@ def settignsMenu():
         printCentered(f"9. Screen Width ({settings['screenWidth']})")
         printCentered("0. Exit")
         printBorder()
-        choice = input(': ')
+        choice = prompt(': ')
         if choice == '0':
             return
         elif choice == '1':
@@ -612,9 +621,11 @@ def settignsMenu():
             printCentered(f"Practice Mode : {settings['practiceMode']}")
             printLineSeperator()
             printCol_2("1. Random", "3. True/False")
-            printCol_2("2. Multiple Choice", "0. Exit")
+            printCol_2("2. Multiple Choice", "4. Typed")
+            printSpaceSeperator()
+            printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             if choice == '0':
                 continue
             elif choice == '1':
@@ -623,6 +634,8 @@ def settignsMenu():
                 settings["practiceMode"] = "multiple choice"
             elif choice == '3':
                 settings["practiceMode"] = "true/false"
+            elif choice == '4':
+                settings["practiceMode"] = "typed"
         elif choice == '2':
             clearScreen()
             printBorder()
@@ -630,7 +643,7 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             try:
                 if choice == '0':
                     continue
@@ -645,11 +658,12 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             try:
                 if choice == '0':
                     continue
                 settings["maxScore"] = int(choice)
+                reindexVocab()
                 saveSettings()
             except Exception:
                 continue
@@ -660,13 +674,14 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             try:
                 if choice == '0':
                     continue
                 settings["maxStreak"] = int(choice)
                 if settings["maxStreak"] < settings['maxScore']:
                     settings["maxStreak"] = settings['maxScore']
+                reindexVocab()
                 saveSettings()
             except Exception:
                 continue
@@ -678,7 +693,7 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             if choice == '0':
                 continue
             elif choice in formatting['bg']:
@@ -692,7 +707,7 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             if choice == '0':
                 continue
             elif choice in formatting['fg']:
@@ -706,7 +721,7 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             if choice == '0':
                 continue
             elif choice in formatting['fg']:
@@ -720,7 +735,7 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             if choice == '0':
                 continue
             elif choice in formatting['fg']:
@@ -734,7 +749,7 @@ def settignsMenu():
             printLineSeperator()
             printCentered("0. Exit")
             printBorder()
-            choice = input(': ')
+            choice = prompt(': ')
             try:
                 if choice == '0':
                     continue
@@ -744,22 +759,34 @@ def settignsMenu():
                 continue
 
 
+# With fastStart set the menu starts with a one line summary instead of the
+# word list, so nothing has to sort or score the whole deck until it is asked
+# for (8. Show List).
+def printMainMenu(showList):
+    if showList:
+        printWordList(showTranslations=settings['showTranslations'])
+    else:
+        printBorder()
+        printCentered(f"{len(vocab)} words in the deck.")
+    printLineSeperator()
+    printCentered("Let's burn some vocab into your brain!")
+    printLineSeperator()
+    printCol_2("1. Practice", "2. Practice All")
+    printCol_2("3. Edit List", "4. Toggle Translation")
+    printCol_2("5. Toggle Score", "6. Settings")
+    printCol_2("7. Update", "8. Hide List" if showList else "8. Show List")
+    printSpaceSeperator()
+    printCentered("0. Exit.")
+    printBorder()
+
+
 def main():
     load()
+    showList = not settings.get('fastStart', False)
     while True:
         clearScreen()
-        printWordList(showTranslations=settings['showTranslations'])
-        printLineSeperator()
-        printCentered("Let's burn some vocab into your brain!")
-        printLineSeperator()
-        printCol_2("1. Practice", "2. Practice All")
-        printCol_2("3. Edit List", "4. Toggle Translation")
-        printCol_2("5. Toggle Score", "6. Settings")
-        printCol_2("7. Update", "")
-        printSpaceSeperator()
-        printCentered("0. Exit.")
-        printBorder()
-        choice = input(":")
+        printMainMenu(showList)
+        choice = prompt(":")
         if choice == '1':
             practice()
         if choice == '2':
@@ -780,13 +807,70 @@ def main():
             printBorder()
             printCentered("Updating...")
             printBorder()
+            screen.flush()
+            store.flush()
             os.system("git pull")
             os.system(sys.executable + " " + __file__)
             exit()
+        elif choice == '8':
+            showList = not showList
         elif choice == '0':
             exit()
         else:
             print("Invalid choice.")
 
 
-main()
+def runCommand(args):
+    parser = argparse.ArgumentParser(prog='practice.py')
+    commands = parser.add_subparsers(dest='command')
+    importCommand = commands.add_parser('import-json', help='Replace the deck with a vocab.json style file.')
+    importCommand.add_argument('file')
+    exportCommand = commands.add_parser('export-json', help='Write the deck to a vocab.json style file.')
+    exportCommand.add_argument('file')
+    wordsCommand = commands.add_parser('import', help='Add words from a CSV, TSV or Anki text export.')
+    wordsCommand.add_argument('file')
+    wordsCommand.add_argument('--format', choices=['csv', 'tsv', 'anki'],
+                              help='Defaults to the file extension (.csv, .tsv, anything else is Anki text).')
+    wordsCommand.add_argument('--category', default='imported',
+                              help='Category for rows that do not name one.')
+    deckCommand = commands.add_parser('export', help='Write the deck to CSV or JSON Lines.')
+    deckCommand.add_argument('file')
+    deckCommand.add_argument('--format', choices=['csv', 'jsonl'],
+                             help='Defaults to the file extension (.jsonl or .ndjson, anything else is CSV).')
+    statsCommand = commands.add_parser('stats', help='Show per-category deck statistics.')
+    statsCommand.add_argument('--json', action='store_true', help='Print the statistics as JSON.')
+    args = parser.parse_args(args)
+
+    load()
+    if args.command == 'import-json':
+        importJson(store, args.file)
+        print(f"Imported {args.file}.")
+    elif args.command == 'export-json':
+        exportJson(vocab, args.file)
+        print(f"Exported {len(vocab)} words to {args.file}.")
+    elif args.command == 'import':
+        categoryCount = len(settings.setdefault('categories', []))
+        importFile(args.file, store, settings, args.format, args.category.lower())
+        if len(settings['categories']) != categoryCount:
+            saveSettings()
+    elif args.command == 'export':
+        count = exportFile(vocab, args.file, args.format)
+        print(f"Exported {count} words to {args.file}.")
+    elif args.command == 'stats':
+        report = deckStats(store)
+        if args.json:
+            print(json.dumps(report, indent=4))
+        else:
+            printStats(report)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    # timings of everything that runs, printed on exit (see metrics.py)
+    if '--profile' in args:
+        args.remove('--profile')
+        metrics.enable()
+    if args:
+        runCommand(args)
+    else:
+        main()
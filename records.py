@@ -0,0 +1,72 @@
+import sys
+from collections.abc import MutableMapping
+
+
+# One vocabulary entry in a fixed set of slots instead of a dict. Reads and
+# writes still go through vWord['score'] and friends, and it converts to a
+# plain dict with dict(vWord) for JSON. Category names are interned, so a
+# deck shares one string per category instead of one per word. schedule holds
+# the state of a scheduling policy (see policies.py) and is only present once
+# a policy has set it.
+class WordRecord(MutableMapping):
+    __slots__ = ('word', 'category', 'isFavorite', 'lastPracticed', 'score', 'streak', 'schedule')
+    fields = frozenset(__slots__)
+    requiredFields = __slots__[:-1]
+
+    def __init__(self, word, category, isFavorite, lastPracticed, score, streak, schedule=None):
+        self.word = word
+        self.category = sys.intern(category)
+        self.isFavorite = isFavorite
+        self.lastPracticed = lastPracticed
+        self.score = score
+        self.streak = streak
+        self.schedule = schedule
+
+    def __getitem__(self, key):
+        if key not in WordRecord.fields or (key == 'schedule' and self.schedule is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in WordRecord.fields:
+            raise KeyError(key)
+        if key == 'category':
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key != 'schedule' or self.schedule is None:
+            raise KeyError(key)
+        self.schedule = None
+
+    def __iter__(self):
+        if self.schedule is None:
+            return iter(WordRecord.requiredFields)
+        return iter(WordRecord.__slots__)
+
+    def __len__(self):
+        return len(WordRecord.requiredFields) + (self.schedule is not None)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def toRecord(entry):
+    if isinstance(entry, WordRecord):
+        return entry
+    return WordRecord(entry['word'], entry['category'], entry['isFavorite'],
+                      entry['lastPracticed'], entry['score'], entry['streak'], entry.get('schedule'))
+
+
+# Replaces every dict entry of vocab with a WordRecord, in place.
+def compactVocab(vocab):
+    for word in vocab:
+        vocab[word] = toRecord(vocab[word])
+    return vocab
+
+
+# json.dump(..., default=recordToJson) writes records as objects.
+def recordToJson(value):
+    if isinstance(value, WordRecord):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
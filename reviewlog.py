@@ -0,0 +1,114 @@
+import os
+import json
+import struct
+from array import array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# One fixed-size record per answer: time, word id, latency in seconds, game
+# and whether the answer was right. Word ids index the word list kept next to
+# the log (file + '.words', one JSON string per line), so the log itself never
+# grows with the length of the words.
+recordFormat = '<dIfBB2x'
+recordSize = struct.calcsize(recordFormat)
+gameCodes = {'multiple choice': 1, 'true/false': 2, 'typed': 3}
+gameNames = dict((code, name) for name, code in gameCodes.items())
+if numpy is not None:
+    reviewDtype = numpy.dtype({'names': ['time', 'word', 'latency', 'game', 'correct'],
+                               'formats': ['<f8', '<u4', '<f4', 'u1', 'u1'],
+                               'offsets': [0, 8, 12, 16, 17], 'itemsize': recordSize})
+
+
+# Append-only log of every answer given, for tuning the scoring rules against
+# real history (see simulator.py). Files are only created on the first
+# record. A torn record or word line from a crash mid-write is cut off when
+# the log is opened again.
+class ReviewLog:
+    def __init__(self, file, syncEvery=64):
+        self.file = file
+        self.wordsFile = file + '.words'
+        self.syncEvery = syncEvery
+        self.unsynced = 0
+        self.f = None
+        self.wordsF = None
+        self.ids = None
+
+    def record(self, word, now, game, isGoodAnswer, latency):
+        if self.f is None:
+            self._open()
+        wordId = self.ids.get(word)
+        if wordId is None:
+            wordId = self.ids[word] = len(self.ids)
+            self.wordsF.write(json.dumps(word) + '\n')
+            self.wordsF.flush()
+        self.f.write(struct.pack(recordFormat, now, wordId, latency, gameCodes.get(game, 0), bool(isGoodAnswer)))
+        self.f.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.syncEvery:
+            self.sync()
+
+    def sync(self):
+        if self.unsynced:
+            os.fsync(self.wordsF.fileno())
+            os.fsync(self.f.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        if self.f is not None:
+            self.sync()
+            self.f.close()
+            self.wordsF.close()
+            self.f = None
+            self.wordsF = None
+
+    def _open(self):
+        words = readWords(self.wordsFile)
+        self.ids = dict((word, wordId) for wordId, word in enumerate(words))
+        _truncate(self.wordsFile, len(''.join(json.dumps(word) + '\n' for word in words).encode('utf-8')))
+        if os.path.exists(self.file):
+            _truncate(self.file, os.path.getsize(self.file) // recordSize * recordSize)
+        self.wordsF = open(self.wordsFile, 'a', encoding='utf-8')
+        self.f = open(self.file, 'ab')
+
+
+def _truncate(file, size):
+    if os.path.exists(file) and os.path.getsize(file) != size:
+        with open(file, 'r+b') as f:
+            f.truncate(size)
+
+
+# Words of the log in id order, up to the first torn line.
+def readWords(file):
+    words = []
+    if os.path.exists(file):
+        with open(file, encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    words.append(json.loads(line))
+                except ValueError:
+                    break
+    return words
+
+
+# (words, reviews) of a log. reviews is a numpy record array with the fields
+# time, word, latency, game and correct, or a dict of arrays with the same
+# keys without numpy.
+def readReviews(file):
+    words = readWords(file + '.words')
+    if not os.path.exists(file):
+        data = b''
+    else:
+        with open(file, 'rb') as f:
+            data = f.read()
+        data = data[:len(data) // recordSize * recordSize]
+    if numpy is not None:
+        return words, numpy.frombuffer(data, dtype=reviewDtype)
+    reviews = {'time': array('d'), 'word': array('I'), 'latency': array('f'), 'game': array('B'), 'correct': array('B')}
+    for fields in struct.iter_unpack(recordFormat, data):
+        for name, value in zip(('time', 'word', 'latency', 'game', 'correct'), fields):
+            reviews[name].append(value)
+    return words, reviews
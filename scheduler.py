@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import math
+
+practiceCooldown = 60 * 5  # 5 minutes
+decayStepSeconds = 3600 * 2  # a word loses one point every two hours at full rate
+
+
+# Time at which a word can be practiced again: its cooldown has passed and its
+# time-adjusted score has dropped below maxScore.
+def getDueTime(vWord, settings):
+    cooldownEnd = vWord['lastPracticed'] + practiceCooldown
+    if settings['maxScore'] <= 0:
+        return math.inf
+    if vWord['score'] < settings['maxScore']:
+        return cooldownEnd
+
+    scoreDepletionRate = 1
+    if vWord['streak'] > 0:
+        if vWord['streak'] >= settings['maxStreak']:
+            return math.inf
+        scoreDepletionRate = 1 - vWord['streak'] / settings['maxStreak']
+
+    stepsNeeded = math.floor(vWord['score'] - settings['maxScore']) + 1
+    decayEnd = vWord['lastPracticed'] + \
+        stepsNeeded * decayStepSeconds / scoreDepletionRate
+    return max(cooldownEnd, decayEnd)
+
+
+# Indexed min-heap of words keyed on their due time. Favorites live in their own
+# heap so they are always offered first, the same way sortVocab puts them on top.
+# Due times come from policy (see policies.py).
+class Scheduler:
+    def __init__(self, policy):
+        self.policy = policy
+        self.heaps = {True: [], False: []}
+        self.entries = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rebuild(self, vocab):
+        self.heaps = {True: [], False: []}
+        self.entries = {}
+        for word in vocab:
+            entry = self._makeEntry(word, vocab[word])
+            self.heaps[bool(vocab[word]['isFavorite'])].append(entry)
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def update(self, word, vWord):
+        self.remove(word)
+        entry = self._makeEntry(word, vWord)
+        heapq.heappush(self.heaps[bool(vWord['isFavorite'])], entry)
+        self._compact()
+
+    def remove(self, word):
+        entry = self.entries.pop(word, None)
+        if entry is not None:
+            entry[-1] = None
+
+    # Returns up to num words: due favorites, then due words, then whatever will
+    # become due soonest. Costs O(k log n) for k returned words.
+    def nextWords(self, num, now):
+        popped = []
+        words = []
+        for isFavorite in (True, False):
+            heap = self.heaps[isFavorite]
+            while len(words) < num and self._peek(heap) is not None and heap[0][0] <= now:
+                entry = heapq.heappop(heap)
+                popped.append((heap, entry))
+                words.append(entry[-1])
+
+        while len(words) < num:
+            favorite = self._peek(self.heaps[True])
+            other = self._peek(self.heaps[False])
+            if favorite is None and other is None:
+                break
+            if other is None or (favorite is not None and favorite[0] <= other[0]):
+                heap = self.heaps[True]
+            else:
+                heap = self.heaps[False]
+            entry = heapq.heappop(heap)
+            popped.append((heap, entry))
+            words.append(entry[-1])
+
+        for heap, entry in popped:
+            heapq.heappush(heap, entry)
+        return words
+
+    def _makeEntry(self, word, vWord):
+        entry = [self.policy.dueTime(vWord), next(self.counter), word]
+        self.entries[word] = entry
+        return entry
+
+    # Drops removed entries from the top of the heap and returns the live head.
+    def _peek(self, heap):
+        while heap and heap[0][-1] is None:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _compact(self):
+        size = len(self.heaps[True]) + len(self.heaps[False])
+        if size > 2 * len(self.entries) + 64:
+            for isFavorite in (True, False):
+                heap = [e for e in self.heaps[isFavorite] if e[-1] is not None]
+                heapq.heapify(heap)
+                self.heaps[isFavorite] = heap
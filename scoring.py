@@ -0,0 +1,203 @@
+import math
+from array import array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Color buckets, lowest to highest, as used by getScoredColor.
+scoreColors = ['gray', 'red', 'yellow', 'green', 'cyan', 'blue']
+
+
+# Lowest adjusted score of each color bucket after the first.
+def scoreBounds(settings):
+    sectionLength = int(settings['maxScore'] / 4)
+    return [1, sectionLength, sectionLength * 2, sectionLength * 3, sectionLength * 4]
+
+
+def scoreBucket(adjusted, settings):
+    bounds = scoreBounds(settings)
+    for i, bound in enumerate(bounds):
+        if adjusted < bound:
+            return i
+    return len(bounds)
+
+
+# Score, streak and lastPracticed for the whole deck as typed columns, so every
+# adjusted score for a screen can be computed in one pass with one timestamp.
+class ScoreColumns:
+    def __init__(self):
+        self.keys = []
+        self.rows = {}
+        self.score = array('d')
+        self.streak = array('q')
+        self.lastPracticed = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rebuild(self, vocab):
+        self.keys = list(vocab)
+        self.rows = {word: i for i, word in enumerate(self.keys)}
+        self.score = array('d', (vocab[word]['score'] for word in self.keys))
+        self.streak = array('q', (vocab[word]['streak'] for word in self.keys))
+        self.lastPracticed = array('d', (vocab[word]['lastPracticed'] for word in self.keys))
+
+    # Takes the columns as buffers in the order of keys, e.g. straight from a
+    # snapshot file.
+    def load(self, keys, score, streak, lastPracticed):
+        self.keys = keys
+        self.rows = {word: i for i, word in enumerate(keys)}
+        self.score = array('d')
+        self.score.frombytes(memoryview(score).cast('B'))
+        self.streak = array('q')
+        self.streak.frombytes(memoryview(streak).cast('B'))
+        self.lastPracticed = array('d')
+        self.lastPracticed.frombytes(memoryview(lastPracticed).cast('B'))
+
+    def update(self, word, vWord):
+        row = self.rows.get(word)
+        if row is None:
+            self.rows[word] = len(self.keys)
+            self.keys.append(word)
+            self.score.append(vWord['score'])
+            self.streak.append(vWord['streak'])
+            self.lastPracticed.append(vWord['lastPracticed'])
+        else:
+            self.score[row] = vWord['score']
+            self.streak[row] = vWord['streak']
+            self.lastPracticed[row] = vWord['lastPracticed']
+
+    def remove(self, word):
+        row = self.rows.pop(word, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+            self.score[row] = self.score[last]
+            self.streak[row] = self.streak[last]
+            self.lastPracticed[row] = self.lastPracticed[last]
+        self.keys.pop()
+        self.score.pop()
+        self.streak.pop()
+        self.lastPracticed.pop()
+
+    def adjustScores(self, now, settings):
+        if numpy is not None and self.keys:
+            scores, buckets = self._adjustNumpy(now, settings)
+        else:
+            scores, buckets = self._adjustPython(now, settings)
+        return AdjustedScores(self.rows, scores, buckets)
+
+    # Earliest time after now at which any word's adjusted score drops by a
+    # point, i.e. how long a rendered list stays accurate.
+    def nextScoreChange(self, now, settings):
+        if not self.keys:
+            return math.inf
+        if numpy is not None:
+            return self._nextChangeNumpy(now, settings)
+        return self._nextChangePython(now, settings)
+
+    def _adjustNumpy(self, now, settings):
+        score = numpy.frombuffer(self.score, dtype=numpy.float64)
+        streak = numpy.frombuffer(self.streak, dtype=numpy.int64)
+        lastPracticed = numpy.frombuffer(self.lastPracticed, dtype=numpy.float64)
+        maxStreak = settings['maxStreak']
+
+        # streaks of maxStreak or more never decay, so their rate is unused;
+        # dividing by at least 1 keeps a maxStreak of 0 from warning
+        rate = numpy.where(streak > 0, 1 - streak / max(maxStreak, 1), 1.0)
+        decayed = score - numpy.trunc((now - lastPracticed) / 3600 / 2 * rate)
+        decayed = numpy.maximum(decayed, 0)
+        adjusted = numpy.where((streak > 0) & (streak >= maxStreak), score, decayed)
+
+        bounds = scoreBounds(settings)
+        buckets = numpy.full(len(adjusted), len(bounds), dtype=numpy.int8)
+        for bucket in reversed(range(len(bounds))):
+            buckets[adjusted < bounds[bucket]] = bucket
+        return adjusted.astype(numpy.int64).tolist(), buckets.tolist()
+
+    def _nextChangeNumpy(self, now, settings):
+        score = numpy.frombuffer(self.score, dtype=numpy.float64)
+        streak = numpy.frombuffer(self.streak, dtype=numpy.int64)
+        lastPracticed = numpy.frombuffer(self.lastPracticed, dtype=numpy.float64)
+        maxStreak = settings['maxStreak']
+
+        # streaks of maxStreak or more never decay, so their rate is unused;
+        # dividing by at least 1 keeps a maxStreak of 0 from warning
+        rate = numpy.where(streak > 0, 1 - streak / max(maxStreak, 1), 1.0)
+        decaying = (rate > 0) & ~((streak > 0) & (streak >= maxStreak))
+        rate = numpy.where(decaying, rate, 1.0)
+        steps = numpy.trunc((now - lastPracticed) / 3600 / 2 * rate)
+        decaying &= score - steps > 0
+        if not decaying.any():
+            return math.inf
+        nextChange = lastPracticed + (steps + 1) * 3600 * 2 / rate
+        return float(nextChange[decaying].min())
+
+    def _nextChangePython(self, now, settings):
+        maxStreak = settings['maxStreak']
+        nextChange = math.inf
+        for score, streak, lastPracticed in zip(self.score, self.streak, self.lastPracticed):
+            nextChange = min(nextChange, getNextScoreChange(score, streak, lastPracticed, now, maxStreak))
+        return nextChange
+
+    def _adjustPython(self, now, settings):
+        maxStreak = settings['maxStreak']
+        bounds = scoreBounds(settings)
+        scores = []
+        buckets = []
+        for score, streak, lastPracticed in zip(self.score, self.streak, self.lastPracticed):
+            if streak > 0 and streak >= maxStreak:
+                adjusted = score
+            else:
+                rate = 1 - streak / maxStreak if streak > 0 else 1
+                adjusted = max(score - int((now - lastPracticed) / 3600 / 2 * rate), 0)
+            bucket = len(bounds)
+            for i, bound in enumerate(bounds):
+                if adjusted < bound:
+                    bucket = i
+                    break
+            scores.append(int(adjusted))
+            buckets.append(bucket)
+        return scores, buckets
+
+
+# When one word's adjusted score next drops by a point after now.
+def getNextScoreChange(score, streak, lastPracticed, now, maxStreak):
+    if streak > 0 and streak >= maxStreak:
+        return math.inf
+    rate = 1 - streak / maxStreak if streak > 0 else 1
+    steps = int((now - lastPracticed) / 3600 / 2 * rate)
+    if score - steps <= 0:
+        return math.inf
+    return lastPracticed + (steps + 1) * 3600 * 2 / rate
+
+
+# Result of ScoreColumns.adjustScores, looked up by word. Only valid until the
+# deck next changes.
+class AdjustedScores:
+    def __init__(self, rows, scores, buckets):
+        self.rows = rows
+        self.scores = scores
+        self.buckets = buckets
+
+    def score(self, word):
+        return self.scores[self.rows[word]]
+
+    def color(self, word):
+        return scoreColors[self.buckets[self.rows[word]]]
+
+    # Only for results that own their rows map (see ordering.DeckOrder).
+    def set(self, word, score, bucket):
+        row = self.rows.get(word)
+        if row is None:
+            self.rows[word] = len(self.scores)
+            self.scores.append(score)
+            self.buckets.append(bucket)
+        else:
+            self.scores[row] = score
+            self.buckets[row] = bucket
@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import shutil
+
+ansiPattern = re.compile('\033\\[[0-9;]*m')
+
+
+def visibleLength(text):
+    return len(ansiPattern.sub('', text))
+
+
+# Frame buffer for the terminal UI. Lines are collected between clear() and the
+# next flush() and written in one go. When the previous frame is still on the
+# screen only the lines that changed are rewritten.
+class Screen:
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.frame = []
+        self.shown = None
+        self.shownSize = None
+        self.belowFrame = 0
+        self.pending = []
+        self.isNewFrame = False
+        if os.name == 'nt':
+            os.system('')  # turns on ANSI escape handling in the Windows console
+
+    def clear(self):
+        self.frame = []
+        self.isNewFrame = True
+
+    def write(self, line):
+        if self.isNewFrame:
+            self.frame.append(line)
+        else:
+            self.pending.append(line)
+
+    def flush(self):
+        text = ''
+        if self.isNewFrame:
+            text = self._drawFrame()
+            self.isNewFrame = False
+        if self.pending:
+            text += '\n'.join(self.pending) + '\n'
+            self.belowFrame += len(self.pending)
+            self.pending = []
+        if text:
+            self.out.write(text)
+            self.out.flush()
+
+    # The terminal echoed a line of user input below the frame.
+    def inputDone(self):
+        self.belowFrame += 1
+
+    def _drawFrame(self):
+        frame = self.frame
+        if not self.out.isatty():
+            return '\n'.join(frame) + '\n'
+
+        size = shutil.get_terminal_size()
+        redraw = self.shown is None or size != self.shownSize or \
+            len(frame) >= size.lines or len(self.shown) + self.belowFrame >= size.lines
+        if redraw:
+            text = '\033[H\033[2J\033[3J' + '\n'.join(frame) + '\n'
+        else:
+            parts = []
+            for row, line in enumerate(frame):
+                if row >= len(self.shown) or self.shown[row] != line:
+                    parts.append(f'\033[{row + 1};1H{line}\033[K')
+            parts.append(f'\033[{len(frame) + 1};1H\033[J')
+            text = ''.join(parts)
+        self.shown = frame
+        self.shownSize = size
+        self.belowFrame = 0
+        return text
@@ -0,0 +1,290 @@
+import heapq
+import bisect
+import itertools
+import collections
+import unicodedata
+from array import array
+from ordering import SortedWords
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+gramSize = 3
+# Texts are indexed by n-gram and length, lengths from here on sharing one bucket.
+lengthBuckets = 256
+# Changes since the last rebuild, at least, before rebuilding.
+minChanges = 4096
+# Text ids gathered for a typo-tolerant lookup, about at most, and matches
+# ranked, at most; the rest have fewer n-grams in common.
+maxCandidates = 20000
+maxRanked = 256
+
+
+# Lowercase, without accents and with runs of spaces as one space, so "Café  au
+# lait" is found as "cafe au lait".
+def normalize(text):
+    if text.isascii():
+        return ' '.join(text.lower().split())
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.split())
+
+
+# The distinct n-grams of text padded with a space on each side, so word
+# starts and ends count too.
+def grams(text):
+    padded = f" {text} "
+    return set(padded[i:i + gramSize] for i in range(len(padded) - gramSize + 1))
+
+
+def lengthBucket(length):
+    return min(length, lengthBuckets - 1)
+
+
+# Finds words by their key or translation, both normalized; every word has
+# two texts, with text ids 2 * word id and 2 * word id + 1.
+#
+# Prefix lookups bisect the texts kept sorted, which answers the same
+# queries as a trie in two flat lists. Typo-tolerant lookups use an n-gram
+# index: a text within k edits of the query shares all but at most
+# gramSize * k of its n-grams and is at most k characters longer or shorter,
+# so counting the hits of the query's n-grams among texts of about its
+# length finds every match without looking at the rest.
+#
+# Like BinaryStore's snapshot and overlay, both indexes are a base built in
+# one go (with numpy, the n-gram postings are sorted arrays) plus the words
+# changed since, which get new ids; ids of changed and deleted words are
+# skipped when found. Once the changes outgrow an eighth of the words
+# everything is rebuilt.
+class SearchIndex:
+    def __init__(self):
+        self.rebuild([])
+
+    def __len__(self):
+        return len(self.ids)
+
+    # entries: (word, translation) pairs.
+    def rebuild(self, entries):
+        self._build((word, normalize(word), normalize(translation)) for word, translation in entries)
+
+    def update(self, word, translation):
+        key, translation = normalize(word), normalize(translation)
+        wordId = self.ids.get(word)
+        if wordId is not None and self.texts[2 * wordId] == key and self.texts[2 * wordId + 1] == translation:
+            return
+        self._remove(word)
+        wordId = self.ids[word] = len(self.words)
+        self.words.append(word)
+        self.texts += (key, translation)
+        for textId in (2 * wordId, 2 * wordId + 1):
+            text = self.texts[textId]
+            self.changedTexts.insert(text, textId)
+            bucket = chr(lengthBucket(len(text)))
+            for gram in grams(text):
+                postings = self.changedPostings.get(gram + bucket)
+                if postings is None:
+                    postings = self.changedPostings[gram + bucket] = array('I')
+                postings.append(textId)
+        self.changes += 1
+        self._rebuildIfNeeded()
+
+    def remove(self, word):
+        self._remove(word)
+        self._rebuildIfNeeded()
+
+    # Words whose key or translation starts with text, in alphabetical order.
+    def prefix(self, text, limit=10):
+        text = normalize(text)
+        if not text or limit <= 0:
+            return []
+        hits = []
+        for texts in (self.baseTexts, self.changedTexts):
+            found = set()
+            i = texts.index(text)
+            while i < len(texts) and len(found) < limit and texts.keys[i].startswith(text):
+                word = self.words[texts.words[i] // 2]
+                if word is not None:
+                    hits.append((texts.keys[i], word))
+                    found.add(word)
+                i += 1
+        return list(dict.fromkeys(word for _, word in sorted(hits)))[:limit]
+
+    # Words whose key or translation is within a few typos of text (one
+    # more per ten characters), most n-grams in common first. A match lacks
+    # at most gramSize * maxEdits of the query's n-grams, so it has one of
+    # any gramSize * maxEdits + 1 of them: the rarest ones give the
+    # candidates, which are then looked up in the other postings, all sorted
+    # by text id. When even the rarest n-grams are in most of the deck, only
+    # as many as give maxCandidates are used, which can miss matches.
+    def fuzzy(self, text, limit=10):
+        text = normalize(text)
+        queryGrams = grams(text)
+        maxEdits = 1 + len(text) // 10
+        needed = len(queryGrams) - gramSize * maxEdits
+        if needed <= 0 or limit <= 0:
+            return []
+        buckets = range(lengthBucket(max(len(text) - maxEdits, 0)), lengthBucket(len(text) + maxEdits) + 1)
+        postings = sorted(self._postings(queryGrams, buckets), key=lambda lists: sum(map(len, lists)))
+        seeds = postings[:1]
+        for lists in postings[1:len(queryGrams) - needed + 1]:
+            if sum(map(len, lists)) + sum(len(p) for seed in seeds for p in seed) > maxCandidates:
+                break
+            seeds.append(lists)
+        if numpy is not None:
+            seedIds = [numpy.frombuffer(p, dtype=numpy.uint32) if isinstance(p, array) else p
+                       for lists in seeds for p in lists]
+            if not seedIds:
+                return []
+            candidates, counts = numpy.unique(numpy.concatenate(seedIds), return_counts=True)
+            rest = postings[len(seeds):]
+            for n, lists in enumerate(rest):
+                # candidates that cannot reach needed any more are dropped
+                keep = counts + len(rest) - n >= needed
+                candidates, counts = candidates[keep], counts[keep]
+                for p in lists:
+                    p = numpy.frombuffer(p, dtype=numpy.uint32) if isinstance(p, array) else p
+                    counts += p[numpy.minimum(numpy.searchsorted(p, candidates), len(p) - 1)] == candidates
+            candidates, counts = candidates[counts >= needed], counts[counts >= needed]
+            best = numpy.argsort(-counts, kind='stable')[:maxRanked]
+            hits = zip(candidates[best].tolist(), counts[best].tolist())
+        else:
+            counts = collections.Counter(itertools.chain(*(p for lists in seeds for p in lists)))
+            rest = postings[len(seeds):]
+            for n, lists in enumerate(rest):
+                counts = dict((textId, count) for textId, count in counts.items() if count + len(rest) - n >= needed)
+                for p in lists:
+                    for textId in counts:
+                        i = bisect.bisect_left(p, textId)
+                        counts[textId] += i < len(p) and p[i] == textId
+            hits = heapq.nlargest(maxRanked, ((textId, count) for textId, count in counts.items() if count >= needed),
+                                  key=lambda hit: hit[1])
+        ranked = []
+        for textId, count in hits:
+            word = self.words[textId // 2]
+            if word is not None:
+                ranked.append((-count, abs(len(self.texts[textId]) - len(text)), self.texts[textId], word))
+        ranked.sort()
+        return list(dict.fromkeys(word for *_, word in ranked))[:limit]
+
+    # Prefix matches, then typo-tolerant ones.
+    def search(self, text, limit=10):
+        found = dict.fromkeys(self.prefix(text, limit))
+        if len(found) < limit:
+            for word in self.fuzzy(text, limit):
+                found.setdefault(word)
+        return list(found)[:limit]
+
+    # entries: (word, normalized key, normalized translation).
+    def _build(self, entries):
+        entries = list(entries)
+        self.words = [word for word, _, _ in entries]
+        self.ids = dict(zip(self.words, range(len(self.words))))
+        self.texts = [text for _, key, translation in entries for text in (key, translation)]
+        del entries
+        self.baseTexts = SortedWords(self.texts, range(len(self.texts)))
+        self.changedTexts = SortedWords()
+        self.changedPostings = {}
+        self.changes = 0
+        self.baseKeys = None
+        if numpy is not None and self._buildArrays():
+            return
+        self.basePostings = {}
+        for textId, text in enumerate(self.texts):
+            bucket = chr(lengthBucket(len(text)))
+            for gram in grams(text):
+                postings = self.basePostings.get(gram + bucket)
+                if postings is None:
+                    postings = self.basePostings[gram + bucket] = array('I')
+                postings.append(textId)
+
+    # The n-gram postings as arrays, computed for every text at once from
+    # the texts' characters laid end to end. Characters are numbered in
+    # code point order (charIds), an n-gram is its characters as digits in
+    # base alphabetSize, and baseKeys holds every distinct (n-gram, length
+    # bucket) as n-gram * lengthBuckets + bucket, sorted, each with its text
+    # ids at basePostings[baseStarts[i]:baseStarts[i + 1]]. Keys and text
+    # ids are packed into one int64 per n-gram, so a plain sort groups them;
+    # returns False if that does not fit.
+    def _buildArrays(self):
+        padded = [f" {text} " for text in self.texts]
+        lengths = numpy.fromiter(map(len, padded), dtype=numpy.int64, count=len(padded))
+        codes = numpy.frombuffer(''.join(padded).encode('utf-32-le'), dtype=numpy.uint32)
+        del padded
+        present = numpy.zeros(0x110000, dtype=bool)
+        present[codes] = True
+        alphabetSize = int(present.sum())
+        textBits = len(lengths).bit_length()
+        if (max(alphabetSize, 1) ** gramSize * lengthBuckets) << textBits >= 1 << 63:
+            return False
+        self.charIds = numpy.full(0x110000, -1, dtype=numpy.int32)
+        self.charIds[present] = numpy.arange(alphabetSize, dtype=numpy.int32)
+        self.alphabetSize = alphabetSize
+        chars = self.charIds[codes].astype(numpy.int64)
+        del codes, present
+        count = max(len(chars) - 2, 0)
+        # the last two positions of a text start no n-gram
+        ends = numpy.cumsum(lengths)
+        inside = numpy.ones(len(chars), dtype=bool)
+        inside[ends - 1] = False
+        inside[ends - 2] = False
+        tails = numpy.repeat(numpy.arange(len(lengths), dtype=numpy.int64)
+                             | numpy.minimum(lengths - 2, lengthBuckets - 1) << textBits, lengths)
+        packed = ((chars[:count] * alphabetSize + chars[1:count + 1]) * alphabetSize + chars[2:count + 2]) * lengthBuckets
+        packed = (packed << textBits | tails[:count])[inside[:count]]
+        del chars, inside, tails
+        packed.sort()
+        # a text's repeats of an n-gram are posted once
+        if len(packed):
+            packed = packed[numpy.r_[True, packed[1:] != packed[:-1]]]
+        keys = packed >> textBits
+        self.basePostings = (packed & ((1 << textBits) - 1)).astype(numpy.uint32)
+        del packed
+        starts = numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]])[:len(keys)]
+        self.baseKeys = keys[starts]
+        self.baseStarts = numpy.append(starts, len(keys))
+        return True
+
+    # For every n-gram, its postings among texts of the given length buckets,
+    # each sorted by text id.
+    def _postings(self, queryGrams, buckets):
+        found = []
+        for gram in queryGrams:
+            lists = []
+            for bucket in buckets:
+                if self.baseKeys is None and gram + chr(bucket) in self.basePostings:
+                    lists.append(self.basePostings[gram + chr(bucket)])
+                if gram + chr(bucket) in self.changedPostings:
+                    lists.append(self.changedPostings[gram + chr(bucket)])
+            found.append(lists)
+        if self.baseKeys is None or not len(self.baseKeys):
+            return found
+        keys = []
+        for gram in queryGrams:
+            value = 0
+            for c in gram:
+                charId = int(self.charIds[ord(c)])
+                if charId < 0:
+                    value = -1
+                    break
+                value = value * self.alphabetSize + charId
+            keys += (value * lengthBuckets + bucket if value >= 0 else -1 for bucket in buckets)
+        keys = numpy.array(keys, dtype=numpy.int64)
+        i = numpy.minimum(numpy.searchsorted(self.baseKeys, keys), len(self.baseKeys) - 1)
+        for n, j in enumerate(i.tolist()):
+            if self.baseKeys[j] == keys[n]:
+                found[n // len(buckets)].append(self.basePostings[self.baseStarts[j]:self.baseStarts[j + 1]])
+        return found
+
+    def _remove(self, word):
+        wordId = self.ids.pop(word, None)
+        if wordId is None:
+            return
+        self.words[wordId] = None
+        self.texts[2 * wordId] = self.texts[2 * wordId + 1] = None
+        self.changes += 1
+
+    def _rebuildIfNeeded(self):
+        if self.changes > max(minChanges, len(self.ids) // 8):
+            self._build([(word, self.texts[2 * wordId], self.texts[2 * wordId + 1])
+                         for word, wordId in self.ids.items()])
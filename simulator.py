@@ -0,0 +1,304 @@
+# Offline comparison of scheduling policies (see policies.py) on a simulated
+# learner. Every policy practices the same words with the same learner for the
+# same number of days, and the simulator reports how many reviews a day it
+# asked for and how much was remembered.
+# Usage: python simulator.py [--days N] [--words N] [--new-per-day N] [--max-reviews N] [--seed N]
+#                            [--log FILE] [policy ...]
+#
+# It also replays a review log (see reviewlog.py) through the scoring rules
+# for every combination of the given parameters, to see how well each one
+# tells known words from due ones, and through every given policy (see
+# replayPolicy).
+# Usage: python simulator.py --replay vocab.reviews [--max-score 10,15,20] [--max-streak 35]
+#                            [--multiplier 0.5,0.7] [policy ...]
+import math
+import time
+import random
+import argparse
+import itertools
+import engine
+from practice import defaultSettings
+from policies import policyTypes, getPolicy
+from storage import Store, newEntry
+from scheduler import practiceCooldown
+from reviewlog import ReviewLog, readReviews
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+daySeconds = 3600 * 24
+answerSeconds = 10
+sessionPasses = 3
+
+
+# Memory of one word, as in the exponential forgetting curve: recall after t
+# days is exp(-t / strength). Reviews strengthen it more the closer the word
+# was to being forgotten; forgetting it knocks it back down. difficulty
+# scales how fast strength grows.
+class Learner:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.memory = {}
+
+    def learn(self, word, now):
+        difficulty = self.rng.lognormvariate(0, 0.4)
+        self.memory[word] = [now, 3 / difficulty, difficulty]
+
+    def recall(self, word, now):
+        lastReview, strength, _ = self.memory[word]
+        return math.exp(-max(0, now - lastReview) / daySeconds / strength)
+
+    def review(self, word, now):
+        memory = self.memory[word]
+        p = self.recall(word, now)
+        correct = self.rng.random() < p
+        if correct:
+            memory[1] *= 1 + (0.2 + 5 * (1 - p)) / memory[2]
+        else:
+            memory[1] = max(0.5, memory[1] * 0.5)
+        memory[0] = now
+        return correct
+
+
+# Runs one policy for days days: each day introduces newPerDay words and
+# holds one session of up to sessionPasses passes over the due words,
+# practiceCooldown apart, with at most maxReviews answers. Every answer is
+# written to log, a ReviewLog, if given.
+def simulate(policyName, words=500, days=60, newPerDay=20, maxReviews=200, seed=0, log=None):
+    settings = dict(defaultSettings, schedulingPolicy=policyName)
+    store = Store(settings)
+    learner = Learner(seed)
+    rng = random.Random(seed)
+    start = 0
+    reviews = 0
+    correct = 0
+    retention = []
+    for day in range(days):
+        now = start + day * daySeconds + 9 * 3600
+        for i in range(len(store.vocab), min(words, len(store.vocab) + newPerDay)):
+            word = f"word{i}"
+            # due as soon as it is added
+            store.vocab[word] = newEntry(f"translation{i}", "words", now - practiceCooldown)
+            learner.learn(word, now)
+        answered = 0
+        for _ in range(sessionPasses):
+            due = sorted((store.policy.dueTime(store.vocab[word]), word) for word in store.vocab)
+            due = [word for dueAt, word in due if dueAt <= now][:maxReviews - answered]
+            if not due:
+                break
+            rng.shuffle(due)
+            for word in due:
+                engine.startQuestion(store, word, now)
+                isGoodAnswer = learner.review(word, now)
+                engine.gradeAnswer(store.vocab[word], isGoodAnswer, store.policy, now)
+                if log is not None:
+                    log.record(word, now, "multiple choice", isGoodAnswer, answerSeconds)
+                correct += isGoodAnswer
+                now += answerSeconds
+            answered += len(due)
+            now += practiceCooldown
+        reviews += answered
+        end = start + (day + 1) * daySeconds
+        retention.append(sum(learner.recall(word, end) for word in store.vocab) / max(len(store.vocab), 1))
+    known = sum(learner.recall(word, start + days * daySeconds) >= 0.9 for word in store.vocab)
+    return {
+        'policy': policyName,
+        'reviewsPerDay': reviews / days,
+        'answeredRight': correct / max(reviews, 1),
+        'retention': sum(retention) / len(retention),
+        'known': known,
+        'words': len(store.vocab),
+    }
+
+
+# The adjusted score of every review's word just before it was answered, in
+# log order, had the scoring rules run with settings (maxScore, maxStreak)
+# and a wrong answer kept multiplier of the score. A word's history starts
+# at its first review in the log with a score of 0. With numpy all words are
+# stepped at once, one review of each per step.
+def replayScores(reviews, settings, multiplier=engine.wrongAnswerMultiplier):
+    if numpy is not None:
+        return _replayNumpy(reviews, settings, multiplier)
+    return _replayPython(reviews, settings, multiplier)
+
+
+# The same replay, review by review through engine.startQuestion's and
+# engine.gradeAnswer's rules.
+def _replayPython(reviews, settings, multiplier):
+    times = reviews['time']
+    words = reviews['word']
+    correct = reviews['correct']
+    adjusted = [0] * len(times)
+    states = {}
+    for i in sorted(range(len(times)), key=lambda i: (words[i], times[i])):
+        vWord = states.get(words[i])
+        if vWord is None:
+            vWord = states[words[i]] = {'score': 0, 'streak': 0, 'lastPracticed': times[i]}
+        vWord['score'] = adjusted[i] = engine.adjustScoreBasedOnTime(vWord, settings, times[i])
+        vWord['lastPracticed'] = times[i]
+        engine.gradeAnswer(vWord, bool(correct[i]), multiplier=multiplier)
+    return adjusted
+
+
+def _replayNumpy(reviews, settings, multiplier):
+    times = numpy.asarray(reviews['time'], dtype=numpy.float64)
+    words = numpy.asarray(reviews['word'], dtype=numpy.int64)
+    correct = numpy.asarray(reviews['correct'], dtype=bool)
+    count = len(times)
+    adjusted = numpy.zeros(count)
+    if not count:
+        return adjusted
+    # reviews grouped by word in time order, then each one's rank in its group
+    order = numpy.lexsort((times, words))
+    newGroup = numpy.empty(count, dtype=bool)
+    newGroup[0] = True
+    newGroup[1:] = words[order][1:] != words[order][:-1]
+    groupOfSorted = numpy.cumsum(newGroup) - 1
+    starts = numpy.flatnonzero(newGroup)
+    rank = numpy.empty(count, dtype=numpy.int64)
+    rank[order] = numpy.arange(count) - starts[groupOfSorted]
+    group = numpy.empty(count, dtype=numpy.int64)
+    group[order] = groupOfSorted
+    byRank = numpy.argsort(rank, kind='stable')
+    bounds = numpy.searchsorted(rank[byRank], numpy.arange(rank.max() + 2))
+
+    score = numpy.zeros(len(starts))
+    streak = numpy.zeros(len(starts), dtype=numpy.int64)
+    lastPracticed = times[order[starts]]
+    maxStreak = settings['maxStreak']
+    for step in range(len(bounds) - 1):
+        rows = byRank[bounds[step]:bounds[step + 1]]
+        g = group[rows]
+        now = times[rows]
+        s, k = score[g], streak[g]
+        rate = numpy.where(k > 0, 1 - k / max(maxStreak, 1), 1.0)
+        decayed = numpy.maximum(s - numpy.trunc((now - lastPracticed[g]) / 3600 / 2 * rate), 0)
+        a = numpy.where((k > 0) & (k >= maxStreak), s, decayed)
+        adjusted[rows] = a
+        right = correct[rows]
+        score[g] = numpy.where(right, a + 1, numpy.trunc(a * multiplier))
+        streak[g] = numpy.where(right, k + 1, 0)
+        lastPracticed[g] = now
+    return adjusted
+
+
+# How the adjusted scores split the reviews: words the rules called known
+# (score at least maxScore, so not due) should be answered right far more
+# often than due ones.
+def evaluate(adjusted, correct, settings):
+    known = right = knownRight = 0
+    if numpy is not None:
+        adjusted = numpy.asarray(adjusted)
+        correct = numpy.asarray(correct, dtype=bool)
+        isKnown = adjusted >= settings['maxScore']
+        known, right, knownRight = int(isKnown.sum()), int(correct.sum()), int((isKnown & correct).sum())
+    else:
+        for score, isRight in zip(adjusted, correct):
+            isKnown = score >= settings['maxScore']
+            known += isKnown
+            right += bool(isRight)
+            knownRight += isKnown and bool(isRight)
+    due = len(adjusted) - known
+    return {
+        'reviews': len(adjusted),
+        'known': known,
+        'knownRight': knownRight / known if known else 0,
+        'dueRight': (right - knownRight) / due if due else 0,
+    }
+
+
+# Every logged answer, in time order, fed through the policy as if it had
+# been scheduling all along. A log only holds the answers the user really
+# gave, on the days the schedule in use asked for them, so what a policy
+# would have asked on other days cannot be known; instead each answer counts
+# as asked if the policy had the word due by then, giving reviews a day, and
+# its right answers split into those (recall when due) and the rest, which
+# the policy took for remembered (retention of words it would not have asked).
+def replayPolicy(policyName, reviews):
+    settings = dict(defaultSettings, schedulingPolicy=policyName)
+    policy = getPolicy(settings)
+    times = reviews['time']
+    words = reviews['word']
+    correct = reviews['correct']
+    states = {}
+    asked = askedRight = skipped = skippedRight = 0
+    for i in sorted(range(len(times)), key=lambda i: times[i]):
+        now = float(times[i])
+        vWord = states.get(int(words[i]))
+        if vWord is None:
+            # due from its first review on, like a word just added
+            vWord = states[int(words[i])] = newEntry("", "words", now - practiceCooldown)
+        isGoodAnswer = bool(correct[i])
+        if policy.dueTime(vWord) <= now:
+            asked += 1
+            askedRight += isGoodAnswer
+        else:
+            skipped += 1
+            skippedRight += isGoodAnswer
+        vWord['score'] = engine.adjustScoreBasedOnTime(vWord, settings, now)
+        vWord['lastPracticed'] = now
+        engine.gradeAnswer(vWord, isGoodAnswer, policy, now)
+    days = max((float(max(times)) - float(min(times))) / daySeconds, 1) if len(times) else 1
+    return {
+        'policy': policyName,
+        'reviewsPerDay': asked / days,
+        'dueRight': askedRight / asked if asked else 0,
+        'retention': skippedRight / skipped if skipped else 0,
+        'skipped': skipped,
+    }
+
+
+def replayLog(file, maxScores, maxStreaks, multipliers, policyNames=()):
+    words, reviews = readReviews(file)
+    print(f"{len(reviews['time'])} reviews of {len(words)} words")
+    print(f"{'maxScore':>8} {'maxStreak':>9} {'multiplier':>10} {'known':>8} {'known right':>12} "
+          f"{'due right':>10} {'seconds':>8}")
+    for maxScore, maxStreak, multiplier in itertools.product(maxScores, maxStreaks, multipliers):
+        settings = dict(defaultSettings, maxScore=maxScore, maxStreak=maxStreak)
+        started = time.perf_counter()
+        result = evaluate(replayScores(reviews, settings, multiplier), reviews['correct'], settings)
+        print(f"{maxScore:>8} {maxStreak:>9} {multiplier:>10} {result['known'] / max(result['reviews'], 1):>8.1%} "
+              f"{result['knownRight']:>12.1%} {result['dueRight']:>10.1%} {time.perf_counter() - started:>8.2f}")
+    if policyNames:
+        print()
+        print(f"{'policy':<10} {'reviews/day':>12} {'due right':>10} {'retention':>10} {'not due':>8}")
+    for name in policyNames:
+        result = replayPolicy(name, reviews)
+        print(f"{name:<10} {result['reviewsPerDay']:>12.1f} {result['dueRight']:>10.1%} "
+              f"{result['retention']:>10.1%} {result['skipped']:>8}")
+
+
+def numberList(convert):
+    return lambda text: [convert(part) for part in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare scheduling policies on a simulated learner or a review log.')
+    parser.add_argument('policies', nargs='*', default=list(policyTypes))
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--words', type=int, default=500)
+    parser.add_argument('--new-per-day', type=int, default=20)
+    parser.add_argument('--max-reviews', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', help='write the simulated answers to this review log')
+    parser.add_argument('--replay', help='replay this review log instead of simulating')
+    parser.add_argument('--max-score', type=numberList(int), default=[defaultSettings['maxScore']])
+    parser.add_argument('--max-streak', type=numberList(int), default=[defaultSettings['maxStreak']])
+    parser.add_argument('--multiplier', type=numberList(float), default=[engine.wrongAnswerMultiplier])
+    args = parser.parse_args()
+    if args.replay:
+        replayLog(args.replay, args.max_score, args.max_streak, args.multiplier, args.policies)
+        return
+    log = ReviewLog(args.log) if args.log else None
+    print(f"{'policy':<10} {'reviews/day':>12} {'right':>8} {'retention':>10} {'known':>12}")
+    for name in args.policies:
+        result = simulate(name, args.words, args.days, args.new_per_day, args.max_reviews, args.seed, log)
+        print(f"{name:<10} {result['reviewsPerDay']:>12.1f} {result['answeredRight']:>8.1%} "
+              f"{result['retention']:>10.1%} {result['known']:>6}/{result['words']:<5}")
+    if log is not None:
+        log.close()
+
+
+if __name__ == '__main__':
+    main()
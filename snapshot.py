@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from collections.abc import MutableMapping
+from records import WordRecord, toRecord
+
+# vocab.bin layout: a header, then one 8-byte aligned section per column. Rows
+# are sorted by key, so a key is found by binary search. Strings are stored as
+# UTF-8 blobs with an offsets column (row i is data[offsets[i]:offsets[i+1]]).
+# Version 2 adds the scheduling policy state of each word: the state as JSON
+# (empty for none), plus the policy and due time as columns so due times can
+# be read without decoding it. Version 1 files are still read.
+snapshotMagic = b'BBSNAP02'
+snapshotSections = ['keyOffsets', 'keyData', 'wordOffsets', 'wordData', 'category', 'isFavorite',
+                    'streak', 'score', 'lastPracticed', 'categoryNames',
+                    'scheduleOffsets', 'scheduleData', 'schedulePolicy', 'scheduleDue', 'policyNames']
+snapshotVersions = {b'BBSNAP01': (1, snapshotSections[:10]), snapshotMagic: (2, snapshotSections)}
+sectionFormats = {
+    'keyOffsets': 'Q',
+    'wordOffsets': 'Q',
+    'category': 'I',
+    'isFavorite': 'B',
+    'streak': 'q',
+    'score': 'd',
+    'lastPracticed': 'd',
+    'scheduleOffsets': 'Q',
+    'schedulePolicy': 'I',
+    'scheduleDue': 'd',
+}
+byteOrders = {'little': 0, 'big': 1}
+
+
+def headerFormat(sections):
+    return '<8sB' + 'QQ' * len(sections)
+
+
+def headerSize(sections):
+    return (struct.calcsize(headerFormat(sections)) + 7) // 8 * 8
+
+
+# Writes entries, (key, entry) pairs in any order, as a snapshot file. Like
+# saveJson it writes a temp file and renames it over the target.
+def writeSnapshot(entries, file):
+    entries = sorted(entries, key=lambda item: item[0])
+    columns = {name: array(code) for name, code in sectionFormats.items()}
+    keyData = bytearray()
+    wordData = bytearray()
+    scheduleData = bytearray()
+    categoryIds = {}
+    policyIds = {}
+    columns['keyOffsets'].append(0)
+    columns['wordOffsets'].append(0)
+    columns['scheduleOffsets'].append(0)
+    for key, entry in entries:
+        keyData += key.encode('utf-8')
+        wordData += entry['word'].encode('utf-8')
+        columns['keyOffsets'].append(len(keyData))
+        columns['wordOffsets'].append(len(wordData))
+        columns['category'].append(categoryIds.setdefault(entry['category'], len(categoryIds)))
+        columns['isFavorite'].append(bool(entry['isFavorite']))
+        columns['streak'].append(entry['streak'])
+        columns['score'].append(entry['score'])
+        columns['lastPracticed'].append(entry['lastPracticed'])
+        schedule = entry.get('schedule')
+        if schedule is None:
+            columns['schedulePolicy'].append(0)
+            columns['scheduleDue'].append(0)
+        else:
+            scheduleData += json.dumps(schedule, sort_keys=True).encode('utf-8')
+            columns['schedulePolicy'].append(policyIds.setdefault(schedule['policy'], len(policyIds) + 1))
+            columns['scheduleDue'].append(schedule['due'])
+        columns['scheduleOffsets'].append(len(scheduleData))
+
+    sections = dict((name, column.tobytes()) for name, column in columns.items())
+    sections['keyData'] = bytes(keyData)
+    sections['wordData'] = bytes(wordData)
+    sections['scheduleData'] = bytes(scheduleData)
+    sections['categoryNames'] = json.dumps(list(categoryIds)).encode('utf-8')
+    sections['policyNames'] = json.dumps(list(policyIds)).encode('utf-8')
+
+    offsets = []
+    position = headerSize(snapshotSections)
+    for name in snapshotSections:
+        offsets += [position, len(sections[name])]
+        position += (len(sections[name]) + 7) // 8 * 8
+    tmpFile = file + '.tmp'
+    with open(tmpFile, 'wb') as f:
+        f.write(struct.pack(headerFormat(snapshotSections), snapshotMagic, byteOrders[sys.byteorder],
+                            *offsets).ljust(headerSize(snapshotSections), b'\0'))
+        for name in snapshotSections:
+            f.write(sections[name].ljust((len(sections[name]) + 7) // 8 * 8, b'\0'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpFile, file)
+    return len(entries)
+
+
+# A snapshot file mapped into memory. Columns are memoryviews straight into
+# the mapping; strings and records are only decoded for the rows asked for.
+class Snapshot:
+    def __init__(self, file):
+        self.f = open(file, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mm)
+        self.views = []
+        if bytes(self.buffer[:8]) not in snapshotVersions:
+            self.close()
+            raise ValueError(f"{file} is not a vocabulary snapshot.")
+        self.formatVersion, sections = snapshotVersions[bytes(self.buffer[:8])]
+        fields = struct.unpack_from(headerFormat(sections), self.mm)
+        if fields[1] != byteOrders[sys.byteorder]:
+            self.close()
+            raise ValueError(f"{file} was written on a machine with a different byte order.")
+        for i, name in enumerate(sections):
+            offset, length = fields[2 + i * 2], fields[3 + i * 2]
+            view = self.buffer[offset:offset + length]
+            if name in sectionFormats:
+                view = view.cast(sectionFormats[name])
+            self.views.append(view)
+            setattr(self, name, view)
+        self.categoryNames = json.loads(bytes(self.categoryNames).decode('utf-8'))
+        self.count = len(self.keyOffsets) - 1
+        if self.formatVersion < 2:
+            self.scheduleOffsets = None
+            self.policyNames = []
+        else:
+            self.policyNames = json.loads(bytes(self.policyNames).decode('utf-8'))
+
+    def __len__(self):
+        return self.count
+
+    def key(self, row):
+        return str(self.keyData[self.keyOffsets[row]:self.keyOffsets[row + 1]], 'utf-8')
+
+    def word(self, row):
+        return str(self.wordData[self.wordOffsets[row]:self.wordOffsets[row + 1]], 'utf-8')
+
+    def categoryName(self, row):
+        return self.categoryNames[self.category[row]]
+
+    def schedule(self, row):
+        if self.scheduleOffsets is None or self.scheduleOffsets[row] == self.scheduleOffsets[row + 1]:
+            return None
+        return json.loads(str(self.scheduleData[self.scheduleOffsets[row]:self.scheduleOffsets[row + 1]], 'utf-8'))
+
+    def record(self, row):
+        score = self.score[row]
+        return WordRecord(self.word(row), self.categoryName(row), bool(self.isFavorite[row]),
+                          self.lastPracticed[row], int(score) if score.is_integer() else score, self.streak[row],
+                          self.schedule(row))
+
+    # Row of key, or -1.
+    def find(self, key):
+        target = key.encode('utf-8')
+        offsets = self.keyOffsets
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(self.keyData[offsets[middle]:offsets[middle + 1]]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and bytes(self.keyData[offsets[low]:offsets[low + 1]]) == target:
+            return low
+        return -1
+
+    def close(self):
+        for view in getattr(self, 'views', []):
+            view.release()
+        self.views = []
+        self.buffer.release()
+        self.mm.close()
+        self.f.close()
+
+
+# The deck as a mapping over a snapshot. A record is decoded the first time
+# its key is looked up and kept from then on, so changes made to it in place
+# stick. Words added since the snapshot live in added, deleted snapshot keys
+# in deleted. Iteration goes in snapshot (key) order, then added words.
+class SnapshotVocab(MutableMapping):
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.loaded = {}
+        self.added = {}
+        self.deleted = set()
+
+    # Row of key if its value still comes from the snapshot position, or -1.
+    def row(self, key):
+        if key in self.added or key in self.deleted:
+            return -1
+        return self.snapshot.find(key)
+
+    def __getitem__(self, key):
+        entry = self.added.get(key)
+        if entry is None:
+            entry = self.loaded.get(key)
+        if entry is not None:
+            return entry
+        row = self.row(key)
+        if row < 0:
+            raise KeyError(key)
+        entry = self.loaded[key] = self.snapshot.record(row)
+        return entry
+
+    def __setitem__(self, key, value):
+        value = toRecord(value)
+        if key in self.loaded or self.row(key) >= 0:
+            self.loaded[key] = value
+        else:
+            self.added[key] = value
+
+    def __delitem__(self, key):
+        if key in self.added:
+            del self.added[key]
+        elif self.row(key) >= 0:
+            self.loaded.pop(key, None)
+            self.deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.added or key in self.loaded or self.row(key) >= 0
+
+    def __iter__(self):
+        for row in range(len(self.snapshot)):
+            key = self.snapshot.key(row)
+            if key not in self.deleted and key not in self.added:
+                yield key
+        yield from list(self.added)
+
+    def __len__(self):
+        return len(self.snapshot) - len(self.deleted) + len(self.added)
+
+    # (key, entry) for every word without keeping the records decoded for it.
+    def entries(self):
+        for row in range(len(self.snapshot)):
+            key = self.snapshot.key(row)
+            if key not in self.deleted and key not in self.added:
+                entry = self.loaded.get(key)
+                yield key, entry if entry is not None else self.snapshot.record(row)
+        yield from self.added.items()
+
+    # Points the mapping at a new snapshot holding its current contents.
+    # Records already handed out stay the ones returned for their keys.
+    def rebase(self, snapshot):
+        self.loaded.update(self.added)
+        self.snapshot = snapshot
+        self.added = {}
+        self.deleted = set()
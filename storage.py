@@ -0,0 +1,695 @@
+import os
+import json
+import time
+import heapq
+import random
+import sqlite3
+import metrics
+from array import array
+from journal import Journal
+from categoryindex import CategoryIndex
+from scoring import ScoreColumns, getNextScoreChange
+from scheduler import Scheduler, practiceCooldown, decayStepSeconds
+from policies import getPolicy
+from reviewlog import ReviewLog
+from viewcache import ViewCache
+from searchindex import SearchIndex
+from confusions import ConfusionMatrix
+from engine import adjustScoreBasedOnTime
+from records import WordRecord, compactVocab, recordToJson
+from snapshot import Snapshot, SnapshotVocab, writeSnapshot
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def loadJson(file):
+    with open(file) as f:
+        data = json.load(f)
+    return data
+
+
+# Writes to a temp file and renames it over the target, so a crash mid-write
+# never leaves a truncated file behind.
+def saveJson(data, file):
+    tmpFile = file + '.tmp'
+    with open(tmpFile, 'w') as f:
+        json.dump(data, f, indent=4, sort_keys=True, default=recordToJson)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpFile, file)
+
+
+def newEntry(translation, category, now=None):
+    return WordRecord(translation, category, False, time.time() if now is None else now, 0, 0)
+
+
+# Vocabulary backends. Every store loads the deck into a dict, persists single
+# word changes, and answers the two queries practice needs: which words are
+# due and which translations make good wrong answers.
+def openStore(settings, folder='.'):
+    storage = settings.get('storage', 'json')
+    if storage == 'sqlite':
+        store = SqliteStore(settings, os.path.join(folder, 'vocab.db'), os.path.join(folder, 'vocab.json'))
+    elif storage == 'json':
+        store = JsonStore(settings, os.path.join(folder, 'vocab.json'), os.path.join(folder, 'vocab.journal'))
+    elif storage == 'binary':
+        store = BinaryStore(settings, os.path.join(folder, 'vocab.bin'), os.path.join(folder, 'vocab.bin.journal'),
+                            os.path.join(folder, 'vocab.json'))
+    else:
+        raise ValueError(f"Unknown storage backend '{storage}'.")
+    store.reviews = ReviewLog(os.path.join(folder, 'vocab.reviews'))
+    store.confusions = ConfusionMatrix(os.path.join(folder, 'vocab.confusions'))
+    return store
+
+
+# Shared by all backends: an in-memory category index for picking wrong answers,
+# score columns for rendering the whole deck and a cache of views computed
+# from it, keyed by version. policy is the scheduling policy that gives every
+# due time; reindex picks it up again when settings change. reviews is the
+# log of every answer given, if the store keeps one, and confusions which
+# words were taken for which (only in memory unless openStore gives it a
+# file). search finds words by key or translation once searchWords has built
+# it.
+class Store:
+    def __init__(self, settings):
+        self.settings = settings
+        self.policy = getPolicy(settings)
+        self.reviews = None
+        self.confusions = ConfusionMatrix()
+        self.vocab = {}
+        self.categories = CategoryIndex()
+        self.scores = ScoreColumns()
+        self.views = ViewCache()
+        self.orders = {}
+        self.search = None
+        self.version = 0
+
+    def adjustScores(self, now):
+        return self.scores.adjustScores(now, self.settings)
+
+    # latency is the seconds between asking and answering; confusedWith is
+    # the word whose translation was picked instead, if any.
+    def logReview(self, word, game, isGoodAnswer, latency, now=None, confusedWith=None):
+        metrics.count('answers right' if isGoodAnswer else 'answers wrong')
+        metrics.observe('answer latency', latency)
+        if self.reviews is not None:
+            self.reviews.record(word, time.time() if now is None else now, game, isGoodAnswer, latency)
+        if confusedWith is not None:
+            self.confusions.record(word, confusedWith)
+
+    def close(self):
+        if self.reviews is not None:
+            self.reviews.close()
+        self.confusions.close()
+
+    def nextScoreChange(self, now):
+        return self.scores.nextScoreChange(now, self.settings)
+
+    # Up to count other words as {word: translation}, drawn with rng: some
+    # of the words the user took for this one before, then words from its
+    # category and then from the rest of the deck.
+    def distractors(self, word, count, rng=random):
+        picked = {}
+        for other in self.confusions.pick(word, count, rng):
+            # words deleted since are still in the matrix
+            if other != word and other in self.vocab:
+                picked[other] = self.vocab[other]['word']
+        for other, translation in self._sampleDistractors(word, count + len(picked), rng).items():
+            if len(picked) >= count:
+                break
+            picked.setdefault(other, translation)
+        return picked
+
+    def _sampleDistractors(self, word, count, rng):
+        words = self.categories.sample(word, self.vocab[word]['category'], count, rng)
+        return dict((w, self.vocab[w]['word']) for w in words)
+
+    # Words whose key or translation starts with text or is within a few
+    # typos of it, best first.
+    def searchWords(self, text, limit=10):
+        if self.search is None:
+            self.search = SearchIndex()
+            self.search.rebuild(self._searchEntries())
+        return self.search.search(text, limit)
+
+    # (word, entry) for every word, for passes over the whole deck.
+    def entries(self):
+        return self.vocab.items()
+
+    # (word, translation) for every word.
+    def _searchEntries(self):
+        return ((word, entry['word']) for word, entry in self.vocab.items())
+
+    # version changes whenever anything that affects how the deck is listed does.
+    # orders holds the word list orders built by engine.getWordListLayout; a
+    # changed word is moved within them instead of re-sorting the deck.
+    def _indexWord(self, word, entry):
+        self.version += 1
+        self.categories.update(word, entry['category'])
+        self.scores.update(word, entry)
+        self._updateOrders(word, entry)
+        self._updateSearch(word, entry)
+
+    def _updateOrders(self, word, entry):
+        for order in self.orders.values():
+            # scored when it was practiced if that is after the order was built
+            at = max(order.now, entry['lastPracticed'])
+            order.update(word, entry, adjustScoreBasedOnTime(entry, self.settings, at), getNextScoreChange(
+                entry['score'], entry['streak'], entry['lastPracticed'], at, self.settings['maxStreak']))
+
+    def _unindexWord(self, word):
+        self.version += 1
+        self.categories.remove(word)
+        self.scores.remove(word)
+        self._removeFromOrders(word)
+        self._removeFromSearch(word)
+        self.confusions.forget(word)
+
+    def _removeFromOrders(self, word):
+        for order in self.orders.values():
+            order.remove(word)
+
+    def _updateSearch(self, word, entry):
+        if self.search is not None:
+            self.search.update(word, entry['word'])
+
+    def _removeFromSearch(self, word):
+        if self.search is not None:
+            self.search.remove(word)
+
+    def _rebuildIndexes(self):
+        self.version += 1
+        self.categories.rebuild(self.vocab)
+        self.scores.rebuild(self.vocab)
+        self.orders.clear()
+        self.search = None
+
+
+# vocab.json snapshot plus an append-only journal of changes since the last
+# snapshot. Selection runs on an in-memory scheduler.
+class JsonStore(Store):
+    def __init__(self, settings, file='vocab.json', journalFile='vocab.journal'):
+        super().__init__(settings)
+        self.file = file
+        self.journalFile = journalFile
+        self.scheduler = Scheduler(self.policy)
+        self.journal = None
+        self.dirty = False
+
+    def load(self):
+        if not os.path.exists(self.file):
+            print('Vocabulary not found. Creating new one...')
+            saveJson({}, self.file)
+        self.vocab = loadJson(self.file)
+        self.journal = Journal(
+            self.journalFile, self.settings.get('journalSyncEvery', 16))
+        self.journal.replay(self.vocab)
+        compactVocab(self.vocab)
+        self.reindex()
+        self._rebuildIndexes()
+        return self.vocab
+
+    def saveWord(self, word, entry):
+        self.scheduler.update(word, entry)
+        self._indexWord(word, entry)
+        self.journal.record(word, entry)
+        self.dirty = True
+        self._compactIfNeeded()
+
+    # Indexes words already added to vocab without journaling them one by one;
+    # they are written by the next flush.
+    def saveWords(self, words):
+        for word in words:
+            self.scheduler.update(word, self.vocab[word])
+            self._indexWord(word, self.vocab[word])
+        self.dirty = True
+
+    def deleteWord(self, word):
+        self.scheduler.remove(word)
+        self._unindexWord(word)
+        self.journal.record(word, None)
+        self.dirty = True
+        self._compactIfNeeded()
+
+    def saveAll(self, vocab):
+        self.vocab = vocab
+        self.reindex()
+        self._rebuildIndexes()
+        self.flush()
+
+    # Writes a full snapshot of vocab.json and empties the journal.
+    def flush(self):
+        self.journal.sync()
+        saveJson(self.vocab, self.file)
+        self.journal.reset()
+        self.dirty = False
+
+    def reindex(self):
+        self.version += 1
+        self.orders.clear()
+        self.policy = self.scheduler.policy = getPolicy(self.settings)
+        self.scheduler.rebuild(self.vocab)
+
+    def practiceWords(self, num, now):
+        return self.scheduler.nextWords(num, now)
+
+    def close(self):
+        if self.journal is not None:
+            if self.dirty:
+                self.flush()
+            self.journal.close()
+            self.journal = None
+        super().close()
+
+    def _compactIfNeeded(self):
+        if self.journal.size() > self.settings.get('journalMaxBytes', 1024 * 1024):
+            self.flush()
+
+
+# SQLite database with indexes on favorites and due time, so selection is an
+# index query instead of a deck scan. The whole deck is still read into vocab
+# at load, as the word list, search and distractors all work on it; this
+# store saves single words cheaply but loads no faster and uses no less
+# memory than JsonStore. BinaryStore is the one that decodes words lazily.
+class SqliteStore(Store):
+    columns = ['word', 'category', 'isFavorite', 'lastPracticed', 'score', 'streak', 'schedule']
+
+    def __init__(self, settings, file='vocab.db', importFile='vocab.json'):
+        super().__init__(settings)
+        self.file = file
+        self.importFile = importFile
+        self.db = None
+
+    def load(self):
+        isNew = not os.path.exists(self.file)
+        self.db = sqlite3.connect(self.file, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS words (
+            key TEXT PRIMARY KEY,
+            word TEXT NOT NULL,
+            category TEXT NOT NULL,
+            isFavorite INTEGER NOT NULL,
+            lastPracticed REAL NOT NULL,
+            score INTEGER NOT NULL,
+            streak INTEGER NOT NULL,
+            dueAt REAL NOT NULL,
+            schedule TEXT)''')
+        # databases from before scheduling policies
+        if 'schedule' not in [column[1] for column in self.db.execute('PRAGMA table_info(words)')]:
+            self.db.execute('ALTER TABLE words ADD COLUMN schedule TEXT')
+        # distractors are sampled from the in-memory category index instead
+        self.db.execute('DROP INDEX IF EXISTS wordsCategory')
+        self.db.execute('CREATE INDEX IF NOT EXISTS wordsFavoriteDue ON words (isFavorite, dueAt)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS wordsDue ON words (dueAt)')
+        self.db.commit()
+        if isNew and os.path.exists(self.importFile):
+            print(f'Importing {self.importFile} into {self.file}...')
+            self.saveAll(loadJson(self.importFile))
+
+        self.vocab = {}
+        for row in self.db.execute(f"SELECT key, {', '.join(self.columns)} FROM words ORDER BY rowid"):
+            self.vocab[row[0]] = WordRecord(row[1], row[2], bool(row[3]), row[4], row[5], row[6],
+                                            None if row[7] is None else json.loads(row[7]))
+        self._rebuildIndexes()
+        return self.vocab
+
+    def saveWord(self, word, entry):
+        self._indexWord(word, entry)
+        self.db.execute(
+            "INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._row(word, entry))
+        self.flush()
+
+    # Inserts words already added to vocab; they are committed by the next flush.
+    def saveWords(self, words):
+        rows = []
+        for word in words:
+            self._indexWord(word, self.vocab[word])
+            rows.append(self._row(word, self.vocab[word]))
+        self.db.executemany('INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def deleteWord(self, word):
+        self._unindexWord(word)
+        self.db.execute('DELETE FROM words WHERE key = ?', (word,))
+        self.flush()
+
+    def saveAll(self, vocab):
+        self.vocab = vocab
+        self._rebuildIndexes()
+        with self.db:
+            self.db.execute('DELETE FROM words')
+            self.db.executemany('INSERT INTO words VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (self._row(word, vocab[word]) for word in vocab))
+
+    # Every single word change is committed right away. With WAL and
+    # synchronous=NORMAL a commit does not wait for the disk, so an answer
+    # is never lost to the app crashing, only possibly to a power loss.
+    def flush(self):
+        self.db.commit()
+
+    # Due times depend on maxScore, maxStreak and the scheduling policy, so
+    # recompute them when those change.
+    def reindex(self):
+        self.version += 1
+        self.orders.clear()
+        self.policy = getPolicy(self.settings)
+        with self.db:
+            self.db.executemany('UPDATE words SET dueAt = ? WHERE key = ?',
+                                ((self.policy.dueTime(self.vocab[word]), word) for word in self.vocab))
+
+    # Same order as the in-memory scheduler: due favorites, due words, then
+    # whatever becomes due soonest.
+    def practiceWords(self, num, now):
+        words = []
+        for isFavorite in (1, 0):
+            rows = self.db.execute('SELECT key FROM words WHERE isFavorite = ? AND dueAt <= ? ORDER BY dueAt LIMIT ?',
+                                   (isFavorite, now, num - len(words)))
+            words.extend(row[0] for row in rows)
+        if len(words) < num:
+            rows = self.db.execute('SELECT key FROM words WHERE dueAt > ? ORDER BY dueAt LIMIT ?',
+                                   (now, num - len(words)))
+            words.extend(row[0] for row in rows)
+        return words
+
+    def close(self):
+        if self.db is not None:
+            self.flush()
+            self.db.close()
+            self.db = None
+        super().close()
+
+    def _row(self, word, entry):
+        return (word, entry['word'], entry['category'], int(entry['isFavorite']), entry['lastPracticed'],
+                entry['score'], entry['streak'], self.policy.dueTime(entry),
+                None if entry.get('schedule') is None else json.dumps(entry['schedule'], sort_keys=True))
+
+
+# vocab.bin snapshot (see snapshot.py) plus a journal. Loading maps the file
+# and replays the journal; no record is decoded until it is looked up. Due
+# times are computed for the whole deck at once from the mapped columns, so
+# picking practice words only decodes the words picked. The snapshot is only
+# rewritten when the journal outgrows journalMaxBytes or after bulk changes,
+# not on exit.
+class BinaryStore(Store):
+    def __init__(self, settings, file='vocab.bin', journalFile='vocab.bin.journal', importFile='vocab.json'):
+        super().__init__(settings)
+        self.file = file
+        self.journalFile = journalFile
+        self.importFile = importFile
+        self.snapshot = None
+        self.journal = None
+        self.dirty = False
+        self.scoresLoaded = False
+
+    def load(self):
+        if not os.path.exists(self.file):
+            if os.path.exists(self.importFile):
+                print(f'Importing {self.importFile} into {self.file}...')
+                writeSnapshot(compactVocab(loadJson(self.importFile)).items(), self.file)
+            else:
+                writeSnapshot([], self.file)
+        self.snapshot = Snapshot(self.file)
+        self.vocab = SnapshotVocab(self.snapshot)
+        self.journal = Journal(
+            self.journalFile, self.settings.get('journalSyncEvery', 16))
+        self.masked = bytearray(len(self.snapshot))
+        self.categoryRows = {}
+        self.journal.replay(self.vocab)
+        if self.snapshot.formatVersion < 2:
+            self._writeSnapshot(self.vocab.entries())
+        # reindex computes the due times of the replayed words
+        self.overlay = dict.fromkeys(list(self.vocab.loaded) + list(self.vocab.added))
+        for word in self.vocab.deleted:
+            self._maskWord(word)
+        self.reindex()
+        return self.vocab
+
+    def saveWord(self, word, entry):
+        self._overlayWord(word, entry)
+        self._indexWord(word, entry)
+        self.journal.record(word, entry)
+        self._compactIfNeeded()
+
+    # Words already added to vocab; they are written by the next flush.
+    def saveWords(self, words):
+        for word in words:
+            self._overlayWord(word, self.vocab[word])
+            self._indexWord(word, self.vocab[word])
+        self.dirty = True
+
+    def deleteWord(self, word):
+        self._maskWord(word)
+        self.overlay.pop(word, None)
+        self._unindexWord(word)
+        self.journal.record(word, None)
+        self._compactIfNeeded()
+
+    def saveAll(self, vocab):
+        if vocab is self.vocab:
+            self._writeSnapshot(self.vocab.entries())
+        else:
+            self._writeSnapshot(vocab.items())
+            self.vocab.loaded = {}
+            self.search = None
+
+    # Writes a new snapshot after bulk changes; otherwise the journal already
+    # holds everything.
+    def flush(self):
+        if self.dirty:
+            self._writeSnapshot(self.vocab.entries())
+        else:
+            self.journal.sync()
+
+    def reindex(self):
+        self.version += 1
+        self.orders.clear()
+        self.scoresLoaded = False
+        self.policy = getPolicy(self.settings)
+        if numpy is not None:
+            self.dueAt = self._snapshotDueTimes()
+        else:
+            self.dueAt = array('d', (self.policy.dueTime(self.snapshot.record(row))
+                                     for row in range(len(self.snapshot))))
+        for word in self.overlay:
+            self._overlayWord(word, self.vocab[word])
+
+    # Same order as the in-memory scheduler: due favorites, due words, then
+    # whatever becomes due soonest.
+    def practiceWords(self, num, now):
+        picked = []
+        for isFavorite in (True, False):
+            picked += self._soonest(num - len(picked), now, isFavorite)
+        if len(picked) < num:
+            picked += self._soonest(num - len(picked), now, None)
+        return [word for _, word in picked]
+
+    # Like Store._sampleDistractors, sampling snapshot rows by category id
+    # instead of keeping a category index of every word.
+    def _sampleDistractors(self, word, count, rng):
+        vWord = self.vocab[word]
+        picked = {}
+        for sameCategory in (True, False):
+            candidates = self._categoryRows(vWord['category'], sameCategory)
+            extra = [w for w, e in self.vocab.added.items() if (e['category'] == vWord['category']) == sameCategory]
+            attempts = 0
+            while len(picked) < count and attempts < count * 16 and (len(candidates) or extra):
+                attempts += 1
+                choice = rng.randrange(len(candidates) + len(extra))
+                if choice < len(candidates):
+                    row = int(candidates[choice])
+                    key = self.snapshot.key(row)
+                    if key in self.vocab.deleted or key in self.vocab.added:
+                        continue
+                    translation = self.snapshot.word(row)
+                    if key in self.vocab.loaded:
+                        entry = self.vocab.loaded[key]
+                        if (entry['category'] == vWord['category']) != sameCategory:
+                            continue
+                        translation = entry['word']
+                else:
+                    key = extra[choice - len(candidates)]
+                    translation = self.vocab.added[key]['word']
+                if key != word:
+                    picked[key] = translation
+        return picked
+
+    def adjustScores(self, now):
+        self._loadScores()
+        return super().adjustScores(now)
+
+    def nextScoreChange(self, now):
+        self._loadScores()
+        return super().nextScoreChange(now)
+
+    def close(self):
+        if self.journal is not None:
+            if self.dirty:
+                self.flush()
+            self.journal.close()
+            self.journal = None
+            self.snapshot.close()
+        super().close()
+
+    def _indexWord(self, word, entry):
+        self.version += 1
+        if self.scoresLoaded:
+            self.scores.update(word, entry)
+        self._updateOrders(word, entry)
+        self._updateSearch(word, entry)
+
+    def _unindexWord(self, word):
+        self.version += 1
+        if self.scoresLoaded:
+            self.scores.remove(word)
+        self._removeFromOrders(word)
+        self._removeFromSearch(word)
+        self.confusions.forget(word)
+
+    def _rebuildIndexes(self):
+        self.version += 1
+        self.scoresLoaded = False
+        self.orders.clear()
+        self.search = None
+
+    # Records of snapshot rows are decoded one at a time and not kept, so a
+    # pass over the deck leaves it as lazy as it was.
+    def entries(self):
+        return self.vocab.entries()
+
+    # Translations of snapshot rows are read straight from the snapshot,
+    # without decoding whole records.
+    def _searchEntries(self):
+        vocab = self.vocab
+        for row in range(len(self.snapshot)):
+            key = self.snapshot.key(row)
+            if key not in vocab.deleted and key not in vocab.added:
+                entry = vocab.loaded.get(key)
+                yield key, entry['word'] if entry is not None else self.snapshot.word(row)
+        for key, entry in vocab.added.items():
+            yield key, entry['word']
+
+    # Score columns for list views, copied from the snapshot columns. Only the
+    # keys are decoded.
+    def _loadScores(self):
+        if self.scoresLoaded:
+            return
+        snapshot = self.snapshot
+        self.scores.load([snapshot.key(row) for row in range(len(snapshot))],
+                         snapshot.score, snapshot.streak, snapshot.lastPracticed)
+        for word in self.vocab.deleted:
+            self.scores.remove(word)
+        for word in self.overlay:
+            self.scores.update(word, self.vocab[word])
+        for word, entry in self.vocab.loaded.items():
+            self.scores.update(word, entry)
+        self.scoresLoaded = True
+
+    # A changed word: its snapshot row (if any) stops counting and its due
+    # time is tracked here instead.
+    def _overlayWord(self, word, entry):
+        self._maskWord(word)
+        self.overlay[word] = (self.policy.dueTime(entry), bool(entry['isFavorite']))
+
+    def _maskWord(self, word):
+        row = self.snapshot.find(word)
+        if row >= 0:
+            self.masked[row] = 1
+
+    # policy.dueTime for every snapshot row at once: the due time stored with
+    # the row's policy state if it is for the current policy, else
+    # scheduler.getDueTime.
+    def _snapshotDueTimes(self):
+        snapshot = self.snapshot
+        score = numpy.frombuffer(snapshot.score, dtype=numpy.float64)
+        streak = numpy.frombuffer(snapshot.streak, dtype=numpy.int64)
+        lastPracticed = numpy.frombuffer(snapshot.lastPracticed, dtype=numpy.float64)
+        maxScore = self.settings['maxScore']
+        maxStreak = self.settings['maxStreak']
+        cooldownEnd = lastPracticed + practiceCooldown
+        if maxScore <= 0:
+            dueAt = numpy.full(len(score), numpy.inf)
+        else:
+            never = (streak > 0) & (streak >= maxStreak)
+            rate = numpy.where((streak > 0) & ~never, 1 - streak / maxStreak, 1.0)
+            decayEnd = lastPracticed + (numpy.floor(score - maxScore) + 1) * decayStepSeconds / rate
+            dueAt = numpy.where(score < maxScore, cooldownEnd,
+                                numpy.where(never, numpy.inf, numpy.maximum(cooldownEnd, decayEnd)))
+        if self.policy.name in snapshot.policyNames:
+            policyId = snapshot.policyNames.index(self.policy.name) + 1
+            scheduled = numpy.frombuffer(snapshot.schedulePolicy, dtype=numpy.uint32) == policyId
+            dueAt = numpy.where(scheduled, numpy.frombuffer(snapshot.scheduleDue, dtype=numpy.float64), dueAt)
+        return dueAt
+
+    # Up to num (due time, word) pairs with the earliest due times, from the
+    # snapshot and the overlay: due favorites or due non-favorites, or any word
+    # not yet due for isFavorite None.
+    def _soonest(self, num, now, isFavorite):
+        if num <= 0:
+            return []
+        if isFavorite is None:
+            overlay = [(due, w) for w, (due, _) in self.overlay.items() if due > now]
+        else:
+            overlay = [(due, w) for w, (due, favorite) in self.overlay.items()
+                       if favorite == isFavorite and due <= now]
+        if numpy is not None:
+            dueAt = self.dueAt
+            live = numpy.frombuffer(self.masked, dtype=numpy.uint8) == 0
+            if isFavorite is None:
+                live &= dueAt > now
+            else:
+                live &= (numpy.frombuffer(self.snapshot.isFavorite, dtype=numpy.uint8) == isFavorite) & (dueAt <= now)
+            rows = numpy.flatnonzero(live)
+            if len(rows) > num:
+                rows = rows[numpy.argpartition(dueAt[rows], num)[:num]]
+            rows = [(float(dueAt[row]), int(row)) for row in rows]
+        else:
+            rows = heapq.nsmallest(num, (
+                (self.dueAt[row], row) for row in range(len(self.snapshot)) if not self.masked[row] and (
+                    self.dueAt[row] > now if isFavorite is None else
+                    bool(self.snapshot.isFavorite[row]) == isFavorite and self.dueAt[row] <= now)))
+        picked = [(due, self.snapshot.key(row)) for due, row in rows] + overlay
+        return heapq.nsmallest(num, picked)
+
+    # Snapshot rows in category, or in every other category.
+    def _categoryRows(self, category, sameCategory):
+        if category not in self.categoryRows:
+            snapshot = self.snapshot
+            categoryId = snapshot.categoryNames.index(category) if category in snapshot.categoryNames else -1
+            if numpy is not None:
+                ids = numpy.frombuffer(snapshot.category, dtype=numpy.uint32)
+                self.categoryRows[category] = (numpy.flatnonzero(ids == categoryId), numpy.flatnonzero(ids != categoryId))
+            else:
+                self.categoryRows[category] = ([row for row in range(len(snapshot)) if snapshot.category[row] == categoryId],
+                                               [row for row in range(len(snapshot)) if snapshot.category[row] != categoryId])
+        return self.categoryRows[category][0 if sameCategory else 1]
+
+    def _writeSnapshot(self, entries):
+        self.journal.sync()
+        writeSnapshot(entries, self.file + '.new')
+        self.snapshot.close()
+        os.replace(self.file + '.new', self.file)
+        self.snapshot = Snapshot(self.file)
+        self.vocab.rebase(self.snapshot)
+        self.journal.reset()
+        self.masked = bytearray(len(self.snapshot))
+        self.overlay = {}
+        self.categoryRows = {}
+        self.dirty = False
+        self.reindex()
+
+    def _compactIfNeeded(self):
+        if self.journal.size() > self.settings.get('journalMaxBytes', 1024 * 1024):
+            self._writeSnapshot(self.vocab.entries())
+
+
+# Replaces the contents of store with the deck in a vocab.json style file.
+def importJson(store, file):
+    store.saveAll(compactVocab(loadJson(file)))
+
+
+def exportJson(vocab, file):
+    if isinstance(vocab, SnapshotVocab):
+        vocab = dict(vocab.entries())
+    saveJson(vocab, file)
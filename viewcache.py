@@ -0,0 +1,31 @@
+from collections import OrderedDict
+
+
+# Computed views of a deck (the sorted word list, stats, ...) kept until the
+# deck version changes or their validUntil time passes, whichever comes first.
+# A repeated view is one dict lookup. Least recently used views are dropped
+# beyond maxEntries.
+class ViewCache:
+    def __init__(self, maxEntries=64):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # build() returns (value, validUntil).
+    def get(self, key, version, now, build):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version and now < entry[1]:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        value, validUntil = build()
+        self.entries[key] = (version, validUntil, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.entries.clear()